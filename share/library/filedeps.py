@@ -17,61 +17,169 @@ second (for instance "file1" depends on "file2", which depends on "file3")
 #############################################################################
 
 import GPS
+import collections
 import os.path
-from gps_utils import interactive
+from gps_utils import interactive, hook
+
+NO_DEPENDENCY = "No dependency between these two files"
+
+
+def is_body(file):
+    """
+    Whether file is an Ada body, assuming simple naming schemes.
+
+    :type file: GPS.File
+    :rtype: bool
+    """
+    ext = os.path.splitext(file.path)
+    return ext[1] == ".adb" or (ext[1] == ".ada" and ext[0][-2:] == ".2")
+
+
+class Dependency_Graph(object):
+    """
+    The dependencies between the source files of the project, as computed
+    from the cross-references database. The imports of a file are queried
+    only once, and kept until the next compilation or change of project.
+    """
+
+    def __init__(self):
+        self.__imports = {}
+        # (file, include_implicit) -> the list of files imported by file
+
+        self.__importers = {}
+        # include_implicit -> for each file, the files that import it
+
+    def clear(self):
+        """
+        Forget all dependencies, when the cross-references have changed.
+        """
+        self.__imports.clear()
+        self.__importers.clear()
+
+    def imports(self, file, include_implicit=False):
+        """
+        Return the files that file directly depends on.
+
+        :type file: GPS.File
+        :param bool include_implicit: whether to include implicit
+           dependencies.
+        :rtype: list
+        """
+        key = (file, include_implicit)
+        result = self.__imports.get(key)
+        if result is None:
+            result = [f for f in file.imports(
+                include_implicit=include_implicit, include_system=False)
+                if f]
+
+            # imports does not list the dependency from body to spec, so we
+            # add it explicitly.
+            if is_body(file):
+                spec = file.other_file()
+                if spec and spec != file:
+                    result.append(spec)
+
+            self.__imports[key] = result
+        return result
+
+    def shortest_path(self, from_file, to_file, include_implicit=False):
+        """
+        Return the shortest chain of dependencies from from_file to to_file,
+        as a list of files that starts with from_file and ends with to_file,
+        or None if from_file does not depend on to_file.
+
+        :type from_file: GPS.File
+        :type to_file: GPS.File
+        :param bool include_implicit: whether to include implicit
+           dependencies.
+        :rtype: list|None
+        """
+        parents = {from_file: None}
+        to_analyze = collections.deque([from_file])
+
+        while to_analyze:
+            file = to_analyze.popleft()
+            if file == to_file:
+                path = []
+                while file is not None:
+                    path.append(file)
+                    file = parents[file]
+                path.reverse()
+                return path
+
+            for f in self.imports(file, include_implicit):
+                if f not in parents:
+                    parents[f] = file
+                    to_analyze.append(f)
+
+        return None
+
+    def files_depending_on(self, file, include_implicit=False):
+        """
+        Return all the source files of the project that depend, directly or
+        not, on file, the closest ones first. The first call computes the
+        dependencies of all the sources of the project.
+
+        :type file: GPS.File
+        :param bool include_implicit: whether to include implicit
+           dependencies.
+        :rtype: list
+        """
+        importers = self.__importers.get(include_implicit)
+        if importers is None:
+            importers = collections.defaultdict(list)
+            for f in GPS.Project.root().sources(recursive=True):
+                for imported in self.imports(f, include_implicit):
+                    importers[imported].append(f)
+            self.__importers[include_implicit] = importers
+
+        result = []
+        seen = set([file])
+        to_analyze = collections.deque([file])
+
+        while to_analyze:
+            for f in importers.get(to_analyze.popleft(), []):
+                if f not in seen:
+                    seen.add(f)
+                    result.append(f)
+                    to_analyze.append(f)
+
+        return result
+
+
+graph = Dependency_Graph()
+
+
+@hook('compilation_finished')
+def __on_compilation_finished(*args, **kwargs):
+    graph.clear()
+
+
+@hook('xref_updated')
+def __on_xref_updated(*args, **kwargs):
+    graph.clear()
+
+
+@hook('project_view_changed')
+def __on_project_view_changed(*args, **kwargs):
+    graph.clear()
 
 
 def internal_dependency_path(from_file, to_file, include_implicit):
-    # We do the computation starting from to_file, since it is more efficient
-    # to compute "imported" files than "importing files". Since we want to
-    # compute the path itself, do not do a recursive search.
-    deps = dict()
-
-    # List of files to analyze. This is a list of tuples, the first element of
-    # which is the name of the file to analyze, and the second is the name of
-    # the parent that put it in the list
-    to_analyze = [(from_file, None)]
-
-    while len(to_analyze) != 0:
-        (file, because_of) = to_analyze.pop()
-        imports = file.imports(include_implicit=include_implicit,
-                               include_system=False)
-
-        # imports does not list the dependency from body to spec, so we add it
-        # explicitly if from_file is a body.
-
-        ext = os.path.splitext(from_file.path)
-        if ext[1] == ".adb" or (ext[1] == ".ada" and ext[0][-2:] == ".2"):
-            imports.append(from_file.other_file())
-
-        deps[file] = because_of
-        if file == to_file:
-            break
-
-        for f in imports:
-            if f and f not in deps:
-                to_analyze.append((f, file))
-
-    target = to_file
-    result = ""
-    targets = []
-
-    while target:
-        targets.append(target)
-        result = " -> " + target.path + "\n" + result
-        if target not in deps:
-            result = "No dependency between these two files"
-            break
-        target = deps[target]
-    return (result, targets)
+    path = graph.shortest_path(from_file, to_file, include_implicit)
+    if path is None:
+        return (NO_DEPENDENCY, [to_file])
+
+    result = "".join(" -> " + f.path + "\n" for f in path)
+    path.reverse()
+    return (result, path)
 
 
 def dependency_path(from_file, to_file, fill_location=False, title=""):
     """Shows why modifying to_file implies that from_file needs to be
        recompiled. This information is computed from the cross-references
        database, and requires your application to have been compiled
-       properly. This function does not attempt to compute the shortest
-       dependency path, and just returns the first one it finds.
+       properly. This function returns the shortest dependency path.
        FROM_FILE and TO_FILE must be instances of GPS.File.
        If FILL_LOCATION is True, then the locations view will also be
        filled."""
@@ -90,12 +198,13 @@ def dependency_path(from_file, to_file, fill_location=False, title=""):
     (result, targets) = internal_dependency_path(from_file, to_file,
                                                  include_implicit=False)
 
-    if result == "No dependency between these two files":
+    if result == NO_DEPENDENCY:
         (result, targets) = internal_dependency_path(from_file, to_file,
                                                      include_implicit=True)
 
-    if fill_location and result != "No dependency between these two files":
+    if fill_location and result != NO_DEPENDENCY:
         target = targets.pop()
+        added = False
 
         # Fill the locations view with the result
         while len(targets) != 0:
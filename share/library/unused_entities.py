@@ -22,9 +22,15 @@ they might show references to entities even though these entities are in fact
 no longer used (which means GPS will not correctly report all cases of unused
 entities).
 
-Executing this script blocks the whole GPS interface, so it is normal that
-GPS becomes unresponsive. Depending of the size of your project, this can
-take a while to execute.
+By default, the search runs in the background, and can be interrupted from
+the task manager. It first reads the references in the sources of the
+application that are certainly uses, and then only queries the references
+of the remaining entities, listing those that have no reference other than
+their declaration, body or end label. If the preference "Bulk search" is
+disabled, the references of each entity are queried one at a time instead:
+this blocks the whole GPS interface, so it is normal that GPS becomes
+unresponsive. Depending of the size of your project, this can take a while
+to execute.
 Note that you can save the contents of the Locations window, after execution,
 through the GPS.Locations.dump() method in the python console.
 """
@@ -36,6 +42,17 @@ through the GPS.Locations.dump() method in the python console.
 from GPS import Preference, Project, Console, Editor, File, Locations, \
     EditorBuffer, MDI
 from gps_utils import interactive
+from workflows import task_workflow
+
+CATEGORY = "Unused entity"
+
+USE_KINDS = ('reference', 'modification', 'static call', 'dispatching call')
+# Kinds of references that are always a use of the entity. The references
+# of an entity with none of these kinds are queried one at a time, so that
+# the bulk search finds the same entities as is_unused().
+
+BATCH_SIZE = 200
+# The number of unused entities added to the Locations view at once
 
 xmlada_projects = [
     "xmlada_sax", "xmlada_dom", "xmlada_schema", "xmlada_unicode",
@@ -51,9 +68,15 @@ Preference("Plugins/unused_entities/ignoreprj").create(
     select that project specifically.""",
     ",".join(xmlada_projects + aws_projects))
 
+Preference("Plugins/unused_entities/bulk").create(
+    "Bulk search", "boolean",
+    """Read all the references of the application at once in the
+    background, instead of querying the references of each entity.""",
+    True)
 
-def EntityIterator(where):
-    """Return all entities from WHERE"""
+
+def SourceIterator(where):
+    """Return all source files from WHERE"""
     if not where:
         ignore_projects = [s.strip().lower() for s in Preference(
             "Plugins/unused_entities/ignoreprj").get().split(",")]
@@ -63,14 +86,18 @@ def EntityIterator(where):
                 Console().write(
                     "Searching unused entities in project " + p.name() + "\n")
                 for s in p.sources():
-                    for e in s.entities(local=True):
-                        yield e
+                    yield s
     elif isinstance(where, Project):
         for s in where.sources():
-            for e in s.entities(local=True):
-                yield e
+            yield s
     elif isinstance(where, File):
-        for e in where.entities(local=True):
+        yield where
+
+
+def EntityIterator(where):
+    """Return all entities from WHERE"""
+    for s in SourceIterator(where):
+        for e in s.entities(local=True):
             yield e
 
 
@@ -113,14 +140,99 @@ def UnusedIterator(where, globals_only):
             yield e
 
 
+class Bulk_Search(object):
+    """
+    Search for unused entities by reading the references of all the sources
+    once, and only querying the references of the entities that are not
+    used in these.
+    """
+
+    def __init__(self, where, globals_only):
+        self.where = where
+        self.globals_only = globals_only
+        self.used = set()   # The entities used anywhere
+        self.found = 0
+
+    def run(self, task):
+        """
+        The workflow that performs the search, monitored by task.
+        """
+        yield self.compute_used_entities(task)
+
+        files = list(SourceIterator(self.where))
+        batch = []
+
+        for index, f in enumerate(files):
+            task.set_progress(index, len(files))
+
+            for e in f.entities(local=True):
+                if (not self.globals_only or e.attributes()["global"]) \
+                        and e not in self.used \
+                        and is_unused(e):
+                    batch.append(e)
+
+            if len(batch) >= BATCH_SIZE:
+                self.add_locations(batch)
+                batch = []
+
+            yield None   # let the task manager interrupt the search
+
+        self.add_locations(batch)
+        Console().write(
+            "Done searching for unused entities: {} found\n".format(
+                self.found))
+
+    def compute_used_entities(self, task):
+        """
+        Read the references in all the sources of the application, and
+        compute the set of entities that are certainly used somewhere.
+        GPS.File.references also returns the references that
+        GPS.Entity.references ignores, such as end of spec, so only the
+        kinds in USE_KINDS are considered.
+        """
+        sources = Project.root().sources(recursive=True)
+
+        for index, f in enumerate(sources):
+            task.set_progress(index, len(sources))
+
+            for kind in USE_KINDS:
+                for e, _ in f.references(kind=kind):
+                    self.used.add(e)
+
+            yield None   # let the task manager interrupt the search
+
+    def add_locations(self, entities):
+        """
+        Add a batch of unused entities to the Locations view.
+        """
+        if not entities:
+            return
+
+        output = []
+        for e in entities:
+            decl = e.declaration()
+            output.append("{}:{}:{}: unused entity {}".format(
+                decl.file().path, decl.line(), decl.column(), e.name()))
+
+        Locations.parse("\n".join(output), CATEGORY,
+                        highlight_category="Unused_Entities")
+        self.found += len(entities)
+
+
 def show_unused_entities(where, globals_only):
     """List all unused global entities from WHERE in the locations window"""
     Editor.register_highlighting("Unused_Entities", "blue")
-    Locations.remove_category("Unused entity")
+    Locations.remove_category(CATEGORY)
     MDI.get("Messages").raise_window()
 
+    if Preference("Plugins/unused_entities/bulk").get():
+        Console().write("Searching unused entities in the background\n")
+        search = Bulk_Search(where, globals_only)
+        task_workflow("unused entities", search.run)
+        return
+
     for e in UnusedIterator(where, globals_only=globals_only):
-        Locations.add(category="Unused entity",
+        Locations.add(category=CATEGORY,
                       file=e.declaration().file(),
                       line=e.declaration().line(),
                       column=e.declaration().column(),
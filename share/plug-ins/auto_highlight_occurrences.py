@@ -32,6 +32,7 @@ import GPS
 # from gps_utils import *
 from gps_utils import hook
 from gps_utils.highlighter import Location_Highlighter, OverlayStyle
+import collections
 import re
 
 GPS.Preference(
@@ -61,6 +62,133 @@ GPS.Preference(
 MSG_PREFIX = 'dynamic occurrences '
 # Messages created by this plugin have a category that starts with this
 
+TAB_WIDTH = 8
+# The width of tabulations when computing columns
+
+IDENTIFIER_RE = re.compile(r'^[^\W\d]\w*$', re.UNICODE)
+# The words that can be highlighted when there is no entity: an identifier
+# starts with a letter or an underscore
+
+REFS_CACHE_SIZE = 8
+# The number of files for which the references to entities are kept
+
+
+class References_Cache(object):
+    """
+    The references to entities in the most recently highlighted files, so
+    that highlighting an entity that was already seen in a file does not
+    query the cross-references database again.
+
+    The references of a file are forgotten when it is edited, when its
+    semantic tree is updated and when it is closed. All references are
+    forgotten when the cross-references database or the project changes.
+    """
+
+    def __init__(self, size=REFS_CACHE_SIZE):
+        """
+        :param int size: the maximum number of files in the cache.
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.__files = collections.OrderedDict()
+        # For each file, the references of each entity, as a sorted list of
+        # (line, column, location).
+
+    def references(self, entity, file):
+        """
+        Return the references to entity in file.
+
+        :type entity: GPS.Entity
+        :type file: GPS.File
+        :rtype: list
+        """
+        key = file.path
+        index = self.__files.pop(key, None)
+        if index is None:
+            index = {}
+        self.__files[key] = index  # most recently used
+
+        refs = index.get(entity)
+        if refs is None:
+            self.misses += 1
+            refs = sorted(
+                (r.line(), r.column(), r) for r in entity.references(
+                    include_implicit=False,
+                    synchronous=True,
+                    in_file=file))
+            index[entity] = refs
+
+            while len(self.__files) > self.size:
+                self.__files.popitem(last=False)
+        else:
+            self.hits += 1
+
+        return refs
+
+    def invalidate(self, file=None):
+        """
+        Forget the references in file, or in all files if file is None.
+
+        :type file: GPS.File|None
+        """
+        if file is None:
+            self.__files.clear()
+        else:
+            self.__files.pop(file.path, None)
+
+    def __len__(self):
+        return len(self.__files)
+
+
+def find_word_occurrences(text, word, first_line, limit=0):
+    """
+    Find the occurrences of word as a whole identifier in text.
+
+    :param unicode text: the text to search, which starts at the beginning
+       of a line.
+    :param unicode word: an identifier.
+    :param int first_line: the line number of the start of text.
+    :param int limit: the maximum number of occurrences to return, or 0
+       for all of them.
+    :return: a list of (line, column, length) tuples, where columns start
+       at 1 and take tabulations into account.
+    """
+    if isinstance(word, str):
+        word = word.decode("utf8")
+    if not IDENTIFIER_RE.match(word):
+        return []
+
+    # Identifiers start with a letter or an underscore, so leading digits
+    # are skipped, as in "16#FF#"
+    pattern = re.compile(
+        r'(?<!\w)\d*(%s)(?!\w)' % re.escape(word), re.UNICODE)
+
+    result = []
+    line = first_line
+    line_start = 0   # offset of the start of the current line in text
+    pos = 0          # offset of the last occurrence in text
+
+    for m in pattern.finditer(text):
+        start = m.start(1)
+        newlines = text.count('\n', pos, start)
+        if newlines:
+            line += newlines
+            line_start = text.rfind('\n', pos, start) + 1
+        pos = start
+
+        prefix = text[line_start:start]
+        if '\t' in prefix:
+            column = len(prefix.expandtabs(TAB_WIDTH)) + 1
+        else:
+            column = len(prefix) + 1
+
+        result.append((line, column, len(word)))
+        if len(result) == limit:
+            break
+
+    return result
+
 
 class Current_Entity_Highlighter(Location_Highlighter):
 
@@ -97,6 +225,7 @@ class Current_Entity_Highlighter(Location_Highlighter):
         self.pref_cache = {}
 
         self.current_buffer = None
+        self.refs_cache = References_Cache()
 
         self.highlighted_limit = GPS.Preference(
             "Plugins/auto_highlight_occurrences/highlighting_limit").get()
@@ -107,8 +236,19 @@ class Current_Entity_Highlighter(Location_Highlighter):
         GPS.Hook("preferences_changed").add(self._on_preferences_changed)
         GPS.Hook("location_changed").add_debounce(self.highlight)
         GPS.Hook("file_closed").add(self.__on_file_closed)
+        GPS.Hook("buffer_edited").add(self.__on_file_modified)
+        GPS.Hook("semantic_tree_updated").add(self.__on_file_modified)
+        GPS.Hook("project_view_changed").add(self.__on_xref_changed)
+        GPS.Hook("xref_updated").add(self.__on_xref_changed)
+
+    def __on_file_modified(self, hook, file):
+        self.refs_cache.invalidate(file)
+
+    def __on_xref_changed(self, hook):
+        self.refs_cache.invalidate()
 
     def __on_file_closed(self, hook, file):
+        self.refs_cache.invalidate(file)
         if self.current_buffer:
             if self.current_buffer.file() == file:
                 self.current_buffer = None
@@ -149,14 +289,13 @@ class Current_Entity_Highlighter(Location_Highlighter):
         if self.entity:
             # Compute all refs to the entity immediately, so that we do not
             # have to do any xref query later on when doing the highlighting
-            # This query is fast since it only involves a single source file.
+            # This query is fast since it only involves a single source file,
+            # and its result is kept until the file is modified.
 
             n = self.entity.name()
 
-            return [(n, r) for r in self.entity.references(
-                include_implicit=False,
-                synchronous=True,
-                in_file=buffer.file())]
+            return [(n, r) for _, _, r in self.refs_cache.references(
+                self.entity, buffer.file())]
 
         else:
             return []   # irrelevant
@@ -167,53 +306,21 @@ class Current_Entity_Highlighter(Location_Highlighter):
         if self.entity:
             Location_Highlighter.process(self, start, end)
         else:
+            # Search the whole range at once, and apply the styles in bulk
+
+            if self.highlighted_limit:
+                limit = self.highlighted_limit - self.highlighted
+                if limit <= 0:
+                    return
+            else:
+                limit = 0
+
             buffer = start.buffer()
-            while start < end:
-
-                # Get the string on the line
-                end_loc = start.end_of_line()
-                s = buffer.get_chars(start, end_loc)  # byte-sequence
-                s = s.decode("utf8")  # make unicode-string
-                s_len = len(s)
-
-                # Find the tokens on the current line
-                index = 0
-                visible_column = 0
-
-                while index < s_len:
-                    if s[index].isalpha() or s[index] == '_':
-                        end_index = index + 1
-
-                        while end_index < s_len and (
-                                s[end_index].isalnum() or s[end_index] == '_'):
-                            end_index += 1
-
-                        if s[index:end_index] == self.word:
-                            self.highlighted += 1
-                            self.style.apply(
-                                start=GPS.EditorLocation(
-                                    buffer,
-                                    start.line(),
-                                    start.column() + visible_column),
-                                end=GPS.EditorLocation(
-                                    buffer,
-                                    start.line(),
-                                    start.column() +
-                                    visible_column + len(self.word) - 1))
-
-                        visible_column += end_index - index
-                        index = end_index
-
-                    else:
-                        visible_column += 1
-
-                        if s[index] == '\t':
-                            visible_column = (visible_column +
-                                              8 - (visible_column % 8))
-
-                        index += 1
-
-                start = end_loc + 1
+            text = buffer.get_chars(start, end).decode("utf8")
+            ranges = find_word_occurrences(
+                text, self.word, start.line(), limit)
+            self.highlighted += len(ranges)
+            self.style.apply_ranges(buffer, ranges)
 
     def highlight(self, *args, **kwargs):
         """
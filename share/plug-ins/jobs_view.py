@@ -11,6 +11,8 @@ import GPS
 import os
 import shutil
 import datetime
+import gzip
+import hashlib
 import yaml
 import glob
 import tool_output
@@ -21,6 +23,78 @@ from gps_utils import make_interactive
 
 MAX_SAVED_RUNS = 16  # The maximum number of runs to remember
 
+OUTPUT_FILE = 'output.gz'  # The output of a run, in its save dir
+OBJECTS_DIR = 'objects'  # The contents of the saved files, by hash
+CHUNK_SIZE = 64 * 1024  # The size of the chunks of output read back
+
+
+def store_file(src, dest, objects):
+    """Create dest with the contents of src, as a hard link to the copy of
+       these contents in the objects directory, so that identical files of
+       the different runs share the same storage.
+       Fall back to a copy if hard links are not supported.
+    """
+    if not hasattr(os, 'link'):
+        shutil.copy2(src, dest)
+        return
+
+    h = hashlib.sha1()
+    with open(src, 'rb') as fd:
+        for block in iter(lambda: fd.read(CHUNK_SIZE), b''):
+            h.update(block)
+    obj = os.path.join(objects, h.hexdigest())
+
+    if not os.path.exists(obj):
+        shutil.copy2(src, obj)
+    try:
+        os.link(obj, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def snapshot_tree(src, dest, objects):
+    """Save the tree src as dest, see store_file"""
+    os.makedirs(dest)
+    for name in os.listdir(src):
+        path = os.path.join(src, name)
+        if os.path.isdir(path):
+            snapshot_tree(path, os.path.join(dest, name), objects)
+        else:
+            store_file(path, os.path.join(dest, name), objects)
+
+
+def collect_objects(objects):
+    """Remove the contents which are no longer used by any saved run"""
+    if not os.path.isdir(objects):
+        return
+    for name in os.listdir(objects):
+        path = os.path.join(objects, name)
+        if os.stat(path).st_nlink == 1:
+            os.remove(path)
+
+
+def write_output(filename, chunks):
+    """Write the list of chunks of output compressed in filename"""
+    with gzip.open(filename, 'wb') as fd:
+        for chunk in chunks:
+            fd.write(chunk)
+
+
+def read_output(filename):
+    """Return a generator for the output compressed in filename, in chunks
+       made of complete lines.
+    """
+    with gzip.open(filename, 'rb') as fd:
+        partial = ''
+        for block in iter(lambda: fd.read(CHUNK_SIZE), b''):
+            block = partial + block
+            last = block.rfind('\n') + 1
+            partial = block[last:]
+            if last:
+                yield block[:last]
+        if partial:
+            yield partial
+
 
 class SavedRunManager(object):
     """A singleton which handles the global list of saved runs"""
@@ -41,6 +115,16 @@ class SavedRunManager(object):
             with open(f, 'rb') as fd:
                 self.runs = yaml.load(fd.read())
 
+            # Move the outputs saved inline by older versions to their own
+            # file, so that the archive stays small.
+            inline = [run for run in self.runs.values() if 'output' in run]
+            for run in inline:
+                if not os.path.isdir(self._save_dir(run)):
+                    os.makedirs(self._save_dir(run))
+                write_output(self._output_file(run), [run.pop('output')])
+            if inline:
+                self._save_to_disk()
+
         # Refresh the widget
         if self.widget:
             self.widget.refresh()
@@ -49,12 +133,25 @@ class SavedRunManager(object):
         with open(self._get_archive_file(), 'wb') as fd:
             fd.write(yaml.dump(self.runs))
 
-    def _save_dir(self, run):
+    def _base_dir(self):
         base = os.path.join(GPS.Project.root().artifacts_dir(),
                             'saved_runs')
         if not os.path.exists(base):
             os.mkdir(base)
-        return os.path.join(base, run['timestamp'].replace(':', '_'))
+        return base
+
+    def _save_dir(self, run):
+        return os.path.join(self._base_dir(),
+                            run['timestamp'].replace(':', '_'))
+
+    def _output_file(self, run):
+        return os.path.join(self._save_dir(run), OUTPUT_FILE)
+
+    def _objects_dir(self):
+        objects = os.path.join(self._base_dir(), OBJECTS_DIR)
+        if not os.path.exists(objects):
+            os.mkdir(objects)
+        return objects
 
     def restore_run(self, run_timestamp):
         run = self.runs[run_timestamp]
@@ -62,6 +159,8 @@ class SavedRunManager(object):
         src = self._save_dir(run)
         dest = GPS.Project.root().artifacts_dir()
         for f in glob.glob(os.path.join(src, '*')):
+            if not os.path.isdir(f):
+                continue
             tgt = os.path.join(dest, os.path.basename(f))
             if os.path.exists(tgt):
                 shutil.rmtree(tgt)
@@ -72,13 +171,21 @@ class SavedRunManager(object):
         # Clear the locations
         GPS.Locations.remove_category(run["category"])
 
+        # The output may have been removed from the save dir
+        output = self._output_file(run)
+        if not os.path.isfile(output):
+            GPS.Console("Messages").write(
+                "The output of this run was not found: %s\n" % output)
+            return
+
         # Get the output parser and run the output through it
         parser_text = run['output_parser']
         # TODO: make this part more generic
         if parser_text == "GNATprove_Parser":
             import spark2014
             parser = spark2014.GNATprove_Parser(None)
-        parser.on_stdout(run['output'], None)
+        for chunk in read_output(output):
+            parser.on_stdout(chunk, None)
         parser.on_exit(0, None)  # TODO save status?
 
     def add_run(self, label, output_parser, files, output):
@@ -86,13 +193,13 @@ class SavedRunManager(object):
 
             label: a string in pango markup format, used for display in
             the tree
+            output: the list of chunks of output of the run
         """
         # Add the run to the list
         run = {'label': label,
                'category': output_parser.split('_')[0],  # TODO: improve
                'output_parser': output_parser,
                'files': files,
-               'output': output,
                'timestamp': datetime.datetime.now().isoformat()}
         self.runs[run['timestamp']] = run
 
@@ -101,8 +208,17 @@ class SavedRunManager(object):
         if os.path.exists(dest):
             shutil.rmtree(dest)
         os.mkdir(dest)
+        objects = self._objects_dir()
         for f in files:
-            shutil.copytree(f, os.path.join(dest, os.path.basename(f)))
+            snapshot_tree(f, os.path.join(dest, os.path.basename(f)),
+                          objects)
+        write_output(self._output_file(run), output)
+
+        # Forget the oldest runs
+        for timestamp in sorted(self.runs)[:-MAX_SAVED_RUNS]:
+            old = self.runs.pop(timestamp)
+            shutil.rmtree(self._save_dir(old), ignore_errors=True)
+        collect_objects(objects)
 
         # Save the list to disk
         self._save_to_disk()
@@ -119,11 +235,11 @@ class Job_Recorder(tool_output.OutputParser):
 
     def __init__(self, child):
         tool_output.OutputParser.__init__(self, child)
-        self.raw_text = ''
+        self.chunks = []
         self.child = child
 
     def on_stdout(self, text, command):
-        self.raw_text = self.raw_text + text
+        self.chunks.append(text)
         # Pass the ball to the next child in the chain
         self.child.on_stdout(text, command)
 
@@ -137,7 +253,7 @@ class Job_Recorder(tool_output.OutputParser):
                 self.child.__class__.__name__,
                 [os.path.join(GPS.Project.root().artifacts_dir(),
                               'gnatprove')],
-                self.raw_text)
+                self.chunks)
 
         # Pass the ball to the next child in the chain
         self.child.on_exit(status, command)
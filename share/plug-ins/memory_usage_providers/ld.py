@@ -1,9 +1,12 @@
 import GPS
+import bisect
 import os.path
 import re
+import time
 from . import core
 from os_utils import locate_exec_on_path
 from workflows import run_as_workflow
+from workflows.promises import timeout
 
 MAP_FILE_BASE_NAME = "map.txt"
 
@@ -13,12 +16,218 @@ xml = """
 GPS.current_context())" />
 """
 
+PARSE_BUDGET_MS = 20
+# The maximum time spent parsing the map file before letting GPS process
+# its events
+
+LINES_PER_CHECK = 500
+# The number of lines parsed between two checks of the time spent
+
+# The regexps used to match the information we want to fetch
+REGION_RE = re.compile(r'^(?P<name>\w+)\s+(?P<origin>0x[0-9a-f]+)' +
+                       r'\s+(?P<length>0x[0-9a-f]+)\s+x?r?w?')
+SECTION_RE = re.compile(r'^(?P<name>[\w.]+)\s+(?P<origin>0x[0-9a-f]+)' +
+                        r'\s+(?P<length>0x[0-9a-f]+)')
+MODULE_RE = re.compile(r'^\s+[\w.]*\s+(?P<origin>0x[0-9a-f]+)\s+' +
+                       r'(?P<size>0x[0-9a-f]+) (?P<files>.+\.o\)?)')
+
+NOT_ALLOC_SECTIONS_PREFIXES = ('.debug', '.comment')
+
+
+def is_section_allocated(section):
+    """
+    Return True if the given section tuple is going to be allocated in
+    memory, False otherwise.
+
+    An allocated section is a memory section that will actually be
+    loaded by the target. Sections related with debug information,
+    code comments or that have null size are typically not allocated
+    and should be ignored.
+    """
+    return (not section[0].startswith(NOT_ALLOC_SECTIONS_PREFIXES)
+            and section[2] != 0)
+
+
+class Map_File(object):
+    """
+    The memory regions, sections and modules described in a map
+    file generated by ld. The file is parsed one line at a time with
+    parse_line, so that the parsing can be interrupted.
+    """
+
+    def __init__(self, map_dir):
+        """
+        :param str map_dir: the directory of the map file, where the object
+           files given without a directory are assumed to be.
+        """
+        self.map_dir = map_dir
+        self.regions = []   # (name, origin, length)
+        self.sections = []  # (name, origin, length, region_name)
+        self.modules = []   # (obj, lib, origin, size, region, section)
+
+        self.__region_starts = []  # the sorted start addresses of regions
+        self.__region_ends = []    # the corresponding regions and ends
+        self.__overlapping = False  # whether some regions overlap
+        self.__all_sections = []
+        self.__modules = {}        # (files_info, section_name) -> module
+
+    def region_name_from_address(self, addr):
+        """
+        Return the name of the region associated with the given address or
+        an empty string if not found.
+
+        :param int addr: an address
+        :rtype: str
+        """
+        if self.__overlapping:
+            # Return the first region containing addr, in the order of the
+            # map file
+            for name, origin, length in self.regions:
+                start = int(origin, 16)
+                if start <= addr < start + length:
+                    return name
+            return ""
+
+        index = bisect.bisect_right(self.__region_starts, addr) - 1
+        if index >= 0:
+            end, name = self.__region_ends[index]
+            if addr < end:
+                return name
+        return ""
+
+    def parse_line(self, line):
+        """
+        Parse one line of the map file.
+
+        :param str line: the line
+        """
+        if not line[:1].isspace():
+            # Regions and sections start at the beginning of a line
+            m = REGION_RE.match(line)
+            if m:
+                self.__add_region(m)
+            else:
+                m = SECTION_RE.match(line)
+                if m:
+                    self.__add_section(m)
+
+        elif self.__all_sections:
+            # Don't try to match a module if sections have not been parsed
+            # yet. Modules always refer to an object file.
+            m = '.o' in line and MODULE_RE.match(line)
+            if m:
+                self.__add_module(m)
+
+    def finish(self):
+        """
+        Compute the final lists once all lines have been parsed.
+        """
+        self.modules = [tuple(module)
+                        for module in self.__modules.itervalues()]
+
+        # Keep only the sections that will be allocated in memory
+        self.sections = [s for s in self.__all_sections
+                         if is_section_allocated(s)]
+
+        self.__modules = {}
+
+    def __add_region(self, m):
+        name = m.group('name')
+        origin = int(m.group('origin'), 16)
+        length = int(m.group('length'), 16)
+        self.regions.append((name, m.group('origin'), length))
+
+        index = bisect.bisect_right(self.__region_starts, origin)
+        if (index > 0 and self.__region_ends[index - 1][0] > origin) or (
+                index < len(self.__region_starts)
+                and self.__region_starts[index] < origin + length):
+            self.__overlapping = True
+
+        self.__region_starts.insert(index, origin)
+        self.__region_ends.insert(index, (origin + length, name))
+
+    def __add_section(self, m):
+        section_addr = m.group('origin')
+        self.__all_sections.append(
+            (m.group('name'), section_addr, int(m.group('length'), 16),
+             self.region_name_from_address(int(section_addr, 16))))
+
+    def __add_module(self, m):
+        """
+        A module description gives information about the size taken by an
+        object file in a given section.
+        """
+        files_info = m.group('files')
+        files = re.split(r"\(|\)", files_info)
+
+        # Get the object file name and, if any, information about
+        # the library for which this file has been compiled.
+
+        obj_file = files[0] if len(files) == 1 else files[1]
+        lib_file = files[0] if len(files) > 1 else ""
+        module_size = int(m.group('size'), 16)
+        section = self.__all_sections[-1]
+
+        # Do nothing if the module belongs to a section that will not
+        # be allocated or if it's size is null.
+
+        if module_size == 0 or not is_section_allocated(section):
+            return
+
+        section_name = section[0]
+        module = self.__modules.get((files_info, section_name), None)
+
+        # If the object file name does not contain any directory
+        # information assume that this file is located in the same
+        # directory as the map file.
+
+        if not os.path.dirname(obj_file) and not lib_file:
+            obj_file = os.path.join(self.map_dir, obj_file)
+
+        # If a previous module decription has been found for the same
+        # key, just add the size of this one to the previously found
+        # one.
+
+        if module:
+            module[3] += module_size
+        else:
+            module = [obj_file, lib_file, m.group('origin'), module_size,
+                      section[3], section_name]
+            self.__modules[(files_info, section_name)] = module
+
+
+def parse_map_file(map_file_name):
+    """
+    Parse the given map file, letting GPS process its events regularly.
+    This is a generator, to be run in a workflow: the last value it yields
+    is the Map_File.
+
+    :param str map_file_name: the full path of the map file
+    """
+    result = Map_File(os.path.dirname(map_file_name))
+    start = time.time()
+
+    with open(map_file_name, 'r') as f:
+        for count, line in enumerate(f, 1):
+            result.parse_line(line)
+
+            if count % LINES_PER_CHECK == 0 \
+               and (time.time() - start) * 1000 > PARSE_BUDGET_MS:
+                yield timeout(0)
+                start = time.time()
+
+    result.finish()
+    yield result
+
 
 @core.register_memory_usage_provider("LD")
 class LD(core.MemoryUsageProvider):
 
     _cache = {}
 
+    _parsed_map_files = {}
+    # For each map file, its (mtime, size) and the Map_File parsed from it
+
     # The list of supported targets
     _supported_targets = ["arm-eabi", "leon3-elf", "powerpc-elf",
                           "powerpc-eabispe", "riscv32-elf",
@@ -77,171 +286,20 @@ class LD(core.MemoryUsageProvider):
             visitor.on_memory_usage_data_fetched([], [], [])
             return
 
-        # The information we want to fetch: memory regions and memory sections
-        # ??? Find a way to have a finer grain view (symbols? compilation
-        # units?)
-        regions = []
-        sections = []
-        modules_dict = {}
-        modules = []
-
-        # The regexps used to match the information we want to fetch
-        region_r = re.compile('^(?P<name>\w+)\s+(?P<origin>0x[0-9a-f]+)' +
-                              '\s+(?P<length>0x[0-9a-f]+)\s+x?r?w?')
-        section_r = re.compile('^(?P<name>[\w.]+)\s+(?P<origin>0x[0-9a-f]+)' +
-                               '\s+(?P<length>0x[0-9a-f]+)')
-        module_r = re.compile('^\s+[\w.]*\s+(?P<origin>0x[0-9a-f]+)\s+' +
-                              '(?P<size>0x[0-9a-f]+) (?P<files>.+\.o\)?)')
-
-        def region_name_from_address(addr):
-            """
-            Return the name of the region associated with the given address or
-            an empty string if not found.
-            """
-
-            for region in regions:
-                region_addr = int(region[1], 16)
-                region_size = region[2]
-
-                if addr >= region_addr and addr < (region_addr + region_size):
-                    return region[0]
-
-            return ""
-
-        def is_section_allocated(section):
-            """
-            Return True if the given section tuple is going to be allocated in
-            memory, False otherwise.
-
-            An allocated section is a memory section that will actually be
-            loaded by the target. Sections related with debug information,
-            code comments or that have null size are typically not allocated
-            and should be ignored.
-            """
-
-            not_alloc_sections_prefixes = ['.debug', '.comment']
-
-            for prefix in not_alloc_sections_prefixes:
-                if section[0].startswith(prefix):
-                    return False
-
-            if section[2] == 0:
-                return False
-
-            return True
+        # Reuse the result of the previous parsing if the map file has not
+        # changed since then
+        stat = os.stat(map_file_name)
+        stamp = (stat.st_mtime, stat.st_size)
+        cached = LD._parsed_map_files.get(map_file_name)
 
-        def try_match_region(line):
-            """
-            Try to match a region description in the given line.
-
-            Return a tuple (name, origin, length) if a region was matched
-            and None otherwise.
-            """
-
-            m = region_r.search(line)
-            if m:
-                return (m.group('name'), m.group('origin'),
-                        int(m.group('length'), 16))
-            else:
-                return None
-
-        def try_match_section(line):
-            """
-            Try to match an allocated section description in the given live.
-
-            Return a tuple (name, origin, length, region_name) if a section was
-            matched and None otherwise.
-            """
-
-            m = section_r.search(line)
-
-            if m:
-                section_addr = m.group('origin')
-                region_name = region_name_from_address(int(section_addr, 16))
-                section = (m.group('name'), section_addr,
-                           int(m.group('length'), 16), region_name)
-
-                return section
-            else:
-                return None
-
-        def try_match_module(line):
-            """
-            Try to match a module description in the given line.
-
-            A module description gives information about the size taken by
-            an object file in a given section.
-            """
-
-            # Don't try to match a module if sections have not been parsed yet
-            if not sections:
-                return
-
-            m = module_r.search(line)
-            if m:
-                files_info = m.group('files')
-                files = re.split("\(|\)", files_info)
-
-                # Get the object file name and, if any, information about
-                # the library for which this file has been compiled.
-
-                obj_file = files[0] if len(files) == 1 else files[1]
-                lib_file = files[0] if len(files) > 1 else ""
-                module_size = int(m.group('size'), 16)
-                section = sections[-1]
-
-                # Do nothing if the module belongs to a section that will not
-                # be allocated or if it's size is null.
-
-                if module_size == 0 or not is_section_allocated(section):
-                    return
-
-                section_name = section[0]
-                module = modules_dict.get((files_info, section_name), None)
-
-                # If the object file name does not contain any directory
-                # information assume that this file is located in the same
-                # directory as the map file.
-
-                if not os.path.dirname(obj_file) and not lib_file:
-                    obj_file = os.path.join(map_dir, obj_file)
-
-                # If a previous module decription has been found for the same
-                # key, just add the size of this one to the previously found
-                # one.
-
-                if module:
-                    module[3] += int(m.group('size'), 16)
-                else:
-                    region_name = section[3]
-                    module = [obj_file, lib_file, m.group('origin'),
-                              int(m.group('size'), 16),
-                              region_name, section_name]
-                    modules_dict[(files_info, section_name)] = module
-
-        # Parse the memory map file to retrieve the memory regions and
-        # the path of the linked executable.
-
-        with open(map_file_name, 'r') as f:
-            for line in f:
-                region = try_match_region(line)
-                if not region:
-                    section = try_match_section(line)
-                    if section:
-                        sections.append(section)
-                    else:
-                        try_match_module(line)
-                else:
-                    regions.append(region)
-
-        for module in modules_dict.itervalues():
-            modules.append(tuple(module))
-
-        # Keep only the sections that will be allocated in memory
-
-        sections = [s for s in sections if is_section_allocated(s)]
+        if cached and cached[0] == stamp:
+            result = cached[1]
+        else:
+            result = yield parse_map_file(map_file_name)
+            LD._parsed_map_files[map_file_name] = (stamp, result)
 
-        visitor.on_memory_usage_data_fetched(regions, sections, modules)
+        visitor.on_memory_usage_data_fetched(
+            result.regions, result.sections, result.modules)
 
 
 GPS.parse_xml(xml)
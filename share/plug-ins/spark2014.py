@@ -13,6 +13,7 @@ import GPS
 import os_utils
 import os.path
 import tool_output
+import collections
 import json
 import re
 import sys
@@ -531,6 +532,209 @@ def get_compunit_for_message(text, file):
     return os.path.splitext(fname)[0]
 
 
+class GNATprove_Categories(object):
+
+    """The categories of the checks of GNATprove, as listed by
+       'gnatprove --list-categories', which are the rules of the messages in
+       the Analysis Report.
+       The list is cached in memory and in the GPS home directory for the
+       path and timestamp of the gnatprove executable. When it is not known
+       yet or out of date, it is refreshed in the background, so that
+       starting GNATprove only waits for it if the refresh is not done yet.
+    """
+
+    def __init__(self):
+        self.key = None
+        # The (path, mtime) of the gnatprove executable the categories are
+        # for.
+
+        self.categories = []
+        # The list of (rule id, rule name)
+
+        self.process = None
+        # The process refreshing the categories, if any
+
+    def cache_file(self):
+        """The file where the categories are saved"""
+        return os.path.join(GPS.get_home_dir(), "gnatprove_categories.json")
+
+    def executable_key(self):
+        """Return the (path, mtime) of the gnatprove executable, or None if
+           it is not found.
+        """
+        path = os_utils.locate_exec_on_path(toolname)
+        if not path:
+            return None
+        try:
+            return (path, os.stat(path).st_mtime)
+        except OSError:
+            return None
+
+    def get(self):
+        """Return the categories, and start refreshing them if they are not
+           up to date. The categories of a previous version of gnatprove, or
+           an empty list, are returned until the refresh is done.
+        """
+        key = self.executable_key()
+        if key is not None and key != self.key:
+            self.load(key)
+            if key != self.key:
+                self.refresh(key)
+        return self.categories
+
+    def add_rules(self, analysis_tool):
+        """Add the rules for the categories to analysis_tool. If they are
+           being refreshed, wait for the refresh to finish, so that the
+           messages of the run are not created with unknown rules.
+        """
+        self.get()
+        if self.process is not None:
+            self.process.wait()
+        for rule_id, name in self.categories:
+            analysis_tool.add_rule(name, rule_id)
+
+    def load(self, key):
+        """Load the categories saved for key, if any"""
+        try:
+            with open(self.cache_file(), 'r') as f:
+                saved = json.load(f)
+            if (saved['path'], saved['mtime']) == key:
+                self.key = key
+                self.categories = [tuple(c) for c in saved['categories']]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def save(self):
+        """Save the categories in the cache file"""
+        try:
+            with open(self.cache_file(), 'w') as f:
+                json.dump({'path': self.key[0],
+                           'mtime': self.key[1],
+                           'categories': self.categories}, f)
+        except (IOError, OSError):
+            pass
+
+    def refresh(self, key):
+        """Run 'gnatprove --list-categories' in the background"""
+        if self.process is not None:
+            return
+
+        def on_exit(process, status, output):
+            self.process = None
+            if status != 0:
+                return
+
+            self.key = key
+            self.categories = []
+            for line in output.split('\n'):
+                splitted_line = line.split(' - ')
+                if len(splitted_line) == 3:
+                    self.categories.append(
+                        (splitted_line[0], splitted_line[1]))
+            self.save()
+
+        self.process = GPS.Process([key[0], "--list-categories"],
+                                   on_exit=on_exit)
+
+
+gnatprove_categories = GNATprove_Categories()
+
+
+SPARK_FILES_CACHE_SIZE = 16
+# The number of parsed .spark files kept in memory
+
+
+def parse_trace_file(filename):
+    """ parse the trace file as a list of "file:line" information and
+        return the result
+    """
+
+    lines = []
+    if os.path.isfile(filename):
+        with open(filename, 'r') as f:
+            for line in f:
+                sl = line.split(':')
+                if len(sl) >= 2:
+                    lines.append(
+                        GPS.FileLocation(GPS.File(sl[0]),
+                                         int(sl[1]),
+                                         1))
+    return lines
+
+
+def parsejson(file):
+    """parse the json file "file" and return the mapping
+         id -> extra_info
+       for the messages of its unit.
+       The json file, if it exists and is a valid JSON value, is a dict
+       with two entries "flow" and "proof" (both entries may be absent).
+       Each entry is mapped to a list of dictionaries. Some of these
+       dictionaries have the field "msg_id", these dictionaries are extra
+       information for the corresponding message for the unit. This mapping
+       is later used to act on this extra information for each message.
+
+       :param str file: the path of the .spark file
+       :rtype: dict
+    """
+    extra_info = {}
+    if os.path.isfile(file):
+        with open(file, 'r') as f:
+            try:
+                dict = json.load(f)
+            except ValueError:
+                return extra_info
+        for kind in ('flow', 'proof'):
+            for entry in dict.get(kind, []):
+                if 'msg_id' in entry:
+                    extra_info[entry['msg_id']] = entry
+    return extra_info
+
+
+class Spark_Files(object):
+
+    """The extra information of the .spark files, read on demand.
+       Only the most recently used files are kept in memory, the others are
+       parsed again when needed.
+    """
+
+    def __init__(self, size=SPARK_FILES_CACHE_SIZE):
+        """
+        :param int size: the maximum number of files kept in memory
+        """
+        self.size = size
+        self.__files = collections.OrderedDict()  # path -> id -> extra_info
+
+    def clear(self):
+        """Forget all the files, for instance when GNATprove regenerates
+           them.
+        """
+        self.__files.clear()
+
+    def get(self, file, id):
+        """Return the extra info of message id in the .spark file, or an
+           empty dict if there is none.
+
+           :param str file: the path of the .spark file
+           :param int id: the msg_id of the message
+           :rtype: dict
+        """
+        extra_info = self.__files.pop(file, None)
+        if extra_info is None:
+            extra_info = parsejson(file)
+        self.__files[file] = extra_info
+
+        while len(self.__files) > self.size:
+            self.__files.popitem(last=False)
+
+        return extra_info.get(id, {})
+
+    def __len__(self):
+        return len(self.__files)
+
+
+spark_files = Spark_Files()
+
+
 class GNATprove_Parser(tool_output.OutputParser):
 
     """Class that parses messages of the gnatprove tool, and creates
@@ -588,8 +792,13 @@ class GNATprove_Parser(tool_output.OutputParser):
                                    r"\[#(?P<extra>[0-9]+)\]$")
         self.nested_re = re.compile(r"line ([0-9]+)")
 
-        # holds the mapping "unit,msg_id" -> extra_info
-        self.extra_info = {}
+        # holds the mapping unit -> directory of its .spark file, computed
+        # once per run rather than for each chunk of output
+        self.unit_dirs = {}
+        self.artifact_dirs = None
+
+        # GNATprove regenerates the .spark files
+        spark_files.clear()
 
         # Create a GPS.AnalysisTool instance to collect the messages that will
         # be shown in the report.
@@ -602,70 +811,13 @@ class GNATprove_Parser(tool_output.OutputParser):
         self.analysis_tool.add_rule('errors', 'ERRORS')
 
         # create the SPARK rules from the '--list-categories' switch
-        process = GPS.Process("gnatprove --list-categories")
-        output = process.get_result()
-        for line in output.split('\n'):
-            splitted_line = line.split(' - ')
-            if len(splitted_line) == 3:
-                self.analysis_tool.add_rule(splitted_line[1],
-                                            splitted_line[0])
+        gnatprove_categories.add_rules(self.analysis_tool)
 
     def print_output(self, text):
         """print the text on to the Messages view"""
         if text:
             GPS.Console().write(text + '\n')
 
-    def parse_trace_file(self, filename):
-        """ parse the trace file as a list of "file:line" information and
-            return the result
-        """
-
-        lines = []
-        if os.path.isfile(filename):
-            with open(filename, 'r') as f:
-                for line in f:
-                    sl = line.split(':')
-                    if len(sl) >= 2:
-                        lines.append(
-                            GPS.FileLocation(GPS.File(sl[0]),
-                                             int(sl[1]),
-                                             1))
-        return lines
-
-    def handle_entry(self, unit, list):
-        """code do handle one entry of the JSON file. See :func:`parsejson()`
-           for the details of the format.
-        """
-
-        for entry in list:
-            if 'msg_id' in entry:
-                full_id = unit, entry['msg_id']
-                self.extra_info[full_id] = entry
-
-    def parsejson(self, unit, file):
-        """parse the json file "file", which belongs to unit "unit" and fill
-           the "extra_info" mapping for any entry.
-           The json file, if it exists and is a valid JSON value, is a dict
-           with two entries "flow" and "proof" (both entries may be absent).
-           Each entry is mapped to a list of dictionaries. Some of these
-           dictionaries have the field "msg_id", these dictionaries are extra
-           information for the corresponding message for the current unit. For
-           those messages, we simply build up a mapping
-             (unit, id) -> extra_info
-           which is later used to act on this extra information for each
-           message.
-        """
-        if os.path.isfile(file):
-            with open(file, 'r') as f:
-                try:
-                    dict = json.load(f)
-                    if 'flow' in dict:
-                        self.handle_entry(unit, dict['flow'])
-                    if 'proof' in dict:
-                        self.handle_entry(unit, dict['proof'])
-                except ValueError:
-                    pass
-
     def get_rule_id(self, output, extra):
         """return the rule ID associated to the output.
            The rule ID is retrieved from "extra" when it exists: otherwise,
@@ -686,6 +838,8 @@ class GNATprove_Parser(tool_output.OutputParser):
            which will show/hide the corresponding trace or counterexample,
            and if the message has manual proof information, run the external
            editor.
+           The trace file is only read the first time the action is
+           executed.
         """
 
         # We associate the real check location to the text of the message. The
@@ -699,23 +853,29 @@ class GNATprove_Parser(tool_output.OutputParser):
         if 'check_col' in extra:
             map_msg[text_msg, 'check_col'] = extra['check_col']
 
-        counterexample = {}
-        if 'cntexmp' in extra:
-            counterexample = extra['cntexmp']
+        counterexample = extra.get('cntexmp', {})
 
-        lines = []
+        tracefile = None
         if 'tracefile' in extra and extra['tracefile'] != '':
             tracefile = os.path.join(objdir, extra['tracefile'])
-            lines = self.parse_trace_file(tracefile)
+            if not os.path.isfile(tracefile) \
+               or os.path.getsize(tracefile) == 0:
+                tracefile = None
 
-        if counterexample != {} or lines != []:
+        if counterexample != {} or tracefile:
             if counterexample != {}:
                 msg = 'Show counterexample'
             else:
                 msg = 'Show path'
-            m.set_subprogram(lambda m: toggle_trace(m, lines, counterexample),
-                             'gps-gnatprove-symbolic',
-                             msg)
+            trace = {}
+
+            def on_click(m):
+                if 'lines' not in trace:
+                    trace['lines'] = \
+                        parse_trace_file(tracefile) if tracefile else []
+                toggle_trace(m, trace['lines'], counterexample)
+
+            m.set_subprogram(on_click, 'gps-gnatprove-symbolic', msg)
         # We don't want to open hundreds of editors if a Prove All
         # or Prove File was launched with a manual prover.
         # We only open an editor for prove check.
@@ -825,11 +985,6 @@ class GNATprove_Parser(tool_output.OutputParser):
            which will be used later (in on_exit) to associate more info to the
            message
         """
-        artifact_dirs = (
-            [os.path.join(f, obj_subdir_name)
-             for f in GPS.Project.root().object_dirs(recursive=True)])
-        imported_units = {}  # map from unit to corresponding object directory
-
         lines = text.splitlines()
         for line in lines:
             msg_match = re.match(self.message_re, line)
@@ -849,8 +1004,7 @@ class GNATprove_Parser(tool_output.OutputParser):
                 if extra_match:
                     text = extra_match.group('text')
                     extra, unit = self.get_extra_info(
-                        extra_match.group('extra'), text, file, command,
-                        imported_units, artifact_dirs)
+                        extra_match.group('extra'), text, file)
                 else:
                     extra = {}
 
@@ -868,33 +1022,32 @@ class GNATprove_Parser(tool_output.OutputParser):
                 # Add action to the message
                 if extra:
                     self.act_on_extra_info(
-                        message, extra, imported_units[unit], command)
+                        message, extra, self.unit_dirs[unit], command)
 
-    def get_extra_info(self, id, text, file, command,
-                       imported_units, artifact_dirs):
-        """Parse the .spark file of the corresponding unit to
-           get the extra info.
+    def get_extra_info(self, id, text, file):
+        """Get the extra info from the .spark file of the corresponding
+           unit.
         """
-        extra = {}
         unit = get_compunit_for_message(text, file)
-        full_id = unit, int(id)
         # First time this unit is seen, identify the corresponding
         # object directory where extra info can be found for that unit.
-        if unit not in imported_units:
-            for artifact_dir in artifact_dirs:
+        if unit not in self.unit_dirs:
+            if self.artifact_dirs is None:
+                self.artifact_dirs = (
+                    [os.path.join(f, obj_subdir_name)
+                     for f in GPS.Project.root().object_dirs(recursive=True)])
+            for artifact_dir in self.artifact_dirs:
                 sparkfile = os.path.join(artifact_dir, unit + ".spark")
                 if os.path.exists(sparkfile):
-                    self.parsejson(unit, sparkfile)
-                    imported_units[unit] = artifact_dir
+                    self.unit_dirs[unit] = artifact_dir
                     break
         # If no object directory was identified, associate the default
         # artifacts directory.
-        if unit not in imported_units:
-            imported_units[unit] = GPS.Project.root().artifacts_dir()
+        if unit not in self.unit_dirs:
+            self.unit_dirs[unit] = GPS.Project.root().artifacts_dir()
 
-        if full_id in self.extra_info:
-            extra = self.extra_info[full_id]
-        return extra, unit
+        sparkfile = os.path.join(self.unit_dirs[unit], unit + ".spark")
+        return spark_files.get(sparkfile, int(id)), unit
 
 
 def is_file_context(self):
@@ -1371,6 +1524,9 @@ if gnatprove:
 
     gnatprove_plug = GNATProve_Plugin()
 
+    # Get the categories of checks ready for the first run of GNATprove
+    gnatprove_categories.get()
+
 
 def compute_gnatserver_path():
     """ Compute the position of the gnat_server tool from the one of gnatprove.
@@ -1410,10 +1410,55 @@ class Cursor(Structure):
         )
         return iter(children)
 
+    def find_descendants(self, kinds=None, max_depth=None):
+        """Return the list of the descendants of this cursor, in depth-first
+        preorder, computed with a single walk of the AST.
+
+        kinds, if specified, is a collection of CursorKind: only the cursors
+        of these kinds are returned, but the walk still goes through the
+        other cursors. max_depth, if specified, limits the walk to the
+        descendants at most that many levels below this cursor (1 for its
+        children).
+        """
+        kind_ids = None if kinds is None else set(k.value for k in kinds)
+        tu = self._tu
+        result = []
+
+        if max_depth is None:
+            def visitor(child, parent, result):
+                if kind_ids is None or child._kind_id in kind_ids:
+                    child._tu = tu
+                    result.append(child)
+                return 2  # recurse
+
+        else:
+            # The ancestors of the cursor being visited
+            ancestors = [self]
+
+            def visitor(child, parent, result):
+                while not ancestors[-1] == parent:
+                    ancestors.pop()
+
+                if kind_ids is None or child._kind_id in kind_ids:
+                    child._tu = tu
+                    result.append(child)
+
+                if len(ancestors) < max_depth:
+                    ancestors.append(child)
+                    return 2  # recurse
+                return 1  # continue with the next sibling
+
+        if max_depth != 0:
+            conf.lib.clang_visitChildren(
+                self, callbacks['cursor_visit'](visitor), result
+            )
+        return result
+
     def walk_preorder(self):
         """Depth-first preorder walk over the cursor and its descendants.
 
-        Yields cursors.
+        Yields cursors, so that callers may stop the walk early. To visit
+        all the descendants, find_descendants() is faster.
         """
         yield self
         for child in self.get_children():
@@ -3448,6 +3493,51 @@ def register_functions(lib, ignore_errors):
     map(register, functionList)
 
 
+_function_table = None
+# The items of functionList, indexed by function name. Computed on first use.
+
+
+def get_function_item(name):
+    """Return the item of functionList for the given function name, or None
+    if its prototype is not known.
+    """
+    global _function_table
+    if _function_table is None:
+        _function_table = dict((item[0], item) for item in functionList)
+    return _function_table.get(name)
+
+
+class LazyLibrary(object):
+    """A libclang library instance, whose function prototypes are registered
+    the first time each function is accessed rather than when the library is
+    loaded.
+
+    The registered functions are stored as attributes of the instance, so
+    that later accesses do not go through __getattr__.
+    """
+
+    def __init__(self, lib, ignore_errors):
+        self._lib = lib
+        self._ignore_errors = ignore_errors
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        item = get_function_item(name)
+        if item is None:
+            func = getattr(self._lib, name)
+        else:
+            register_function(self._lib, item, self._ignore_errors)
+
+            # register_function ignored the error if the function does not
+            # exist: report it as a missing attribute.
+            func = getattr(self._lib, name)
+
+        setattr(self, name, func)
+        return func
+
+
 class Config:
     library_path = None
     library_file = None
@@ -3498,8 +3588,8 @@ class Config:
 
     @CachedProperty
     def lib(self):
-        lib = self.get_cindex_library()
-        register_functions(lib, not Config.compatibility_check)
+        lib = LazyLibrary(self.get_cindex_library(),
+                          not Config.compatibility_check)
         Config.loaded = True
         return lib
 
@@ -3536,7 +3626,7 @@ class Config:
     def function_exists(self, name):
         try:
             getattr(self.lib, name)
-        except AttributeError:
+        except (AttributeError, LibclangError):
             return False
 
         return True
@@ -70,6 +70,36 @@ class Gcov_Process (GPS.Console, GPS.Process):
                              on_match=Gcov_Process.on_output)
 
 
+def index_coverage_files(object_dirs):
+    """
+    List the contents of each object directory once, and return a tuple
+    (gcda_dirs, gcno_units): gcda_dirs maps the name of each unit for which
+    there is a .gcda file to the first object directory that contains it,
+    and gcno_units is the set of units for which there is a .gcno file.
+    The names of the units are normalized with os.path.normcase.
+
+    :param list object_dirs: the object directories, in order of precedence
+    :rtype: (dict, set)
+    """
+    gcda_dirs = {}
+    gcno_units = set()
+
+    for object_dir in reversed(object_dirs):
+        try:
+            names = os.listdir(object_dir)
+        except OSError:
+            continue
+
+        for name in names:
+            unit, ext = os.path.splitext(os.path.normcase(name))
+            if ext == ".gcda":
+                gcda_dirs[unit] = object_dir
+            elif ext == ".gcno":
+                gcno_units.add(unit)
+
+    return (gcda_dirs, gcno_units)
+
+
 def using_gcov(context):
     return GPS.Preference('Coverage-Toolchain').get() == 'Gcov'
 
@@ -139,8 +169,10 @@ on which you have permission to read and write.
     # Write the response file
     res = file(input_file, 'wb')
 
+    gcda_dirs, gcno_units = index_coverage_files(object_dirs)
     gcda_file_found = False
     gcno_file_found = False
+    units_written = set()
 
     for p in projects:
         sources = p.sources(False)
@@ -149,29 +181,29 @@ on which you have permission to read and write.
             n = s.path
             basename = n[max(n.rfind('\\'), n.rfind('/')) + 1:len(n)]
             unit = basename[0:basename.rfind('.')]
+            key = os.path.normcase(unit)
 
-            for object_dir in object_dirs:
-                gcda = object_dir + os.sep + unit + ".gcda"
+            # If we have not yet found at least one .gcno file, attempt to
+            # find one. This is to improve the precision of error messages,
+            # and detect the case where compilation was successful but the
+            # executable has never been run.
 
-                # If we have not yet found at least one .gcno file, attempt to
-                # find one. This is to improve the precision of error messages,
-                # and detect the case where compilation was successful but the
-                # executable has never been run.
+            if not gcno_file_found and key in gcno_units:
+                gcno_file_found = True
 
-                if not gcno_file_found:
-                    gcno = object_dir + os.sep + unit + ".gcno"
-                    if os.access(gcno, os.F_OK):
-                        gcno_file_found = True
+            object_dir = gcda_dirs.get(key)
+            if object_dir is not None and key not in units_written:
+                gcda_file_found = True
+                units_written.add(key)
 
-                if os.access(gcda, os.F_OK):
-                    gcda_file_found = True
-                    # Write one entry in response file
+                # Write one entry in response file
+
+                gcda = object_dir + os.sep + unit + ".gcda"
 
-                    # Escape all backslashes.
-                    gcda = gcda.replace('\\', '\\\\')
+                # Escape all backslashes.
+                gcda = gcda.replace('\\', '\\\\')
 
-                    res.write('"' + gcda + '"' + "\n")
-                    break
+                res.write('"' + gcda + '"' + "\n")
 
     res.close()
 
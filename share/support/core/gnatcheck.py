@@ -11,6 +11,7 @@ import GPS
 import os
 import os.path
 import re
+import time
 import traceback
 import os_utils
 from gi.repository import Gtk
@@ -20,6 +21,19 @@ from gps_utils.gnatcheck_rules_editor import rulesEditor, get_supported_rules
 
 gnatcheck = None
 
+CHUNK_LINES = 1000
+# The maximum number of lines of output that are parsed together
+
+CHUNK_DELAY = 0.2
+# The maximum time, in seconds, that a complete line is kept before being
+# parsed
+
+MISSING_COLON_RE = re.compile(
+    r"^([^:\n]*[:][0-9]+:[0-9]+)([^:0-9\n].*)$", re.MULTILINE)
+# gnatcheck sometimes displays incorrectly formatted warnings (not handled
+# by GPS correctly then): "file.ext:nnn:nnn msg" instead of
+# "file.ext:nnn:nnn: msg"
+
 
 class rulesSelector(Gtk.Dialog):
     """
@@ -92,7 +106,11 @@ class gnatCheckProc:
 
         self.locations_string = "Coding Standard violations"
         self.gnatCmd = ""
-        self.full_output = ""
+        self.output_chunks = []   # The parsed output, for CodeFix
+        self.pending = []         # The lines not parsed yet
+        self.partial_line = ""    # The end of the output, not a line yet
+        self.last_parse = 0
+        self.flush_timeout = None  # Parses the pending lines after a delay
 
         self.ruleseditor = None   # The GUI to edit rules
 
@@ -143,38 +161,61 @@ class gnatCheckProc:
         self.ruleseditor = rulesEditor(self.rules, self.rules_file)
         self.ruleseditor.connect('response', self.onResponse)
 
-    def parse_output(self, msg):
-        # gnatcheck sometimes displays incorrectly formatted warnings (not
-        # handled by GPS correctly then)
-        # let's reformat those here:
-        # expecting "file.ext:nnn:nnn: msg"
-        # receiving "file.ext:nnn:nnn msg"
-        res = re.split("^([^:]*[:][0-9]+:[0-9]+)([^:0-9].*)$", msg)
-        if len(res) > 3:
-            msg = res[1] + ":" + res[2]
-        GPS.Locations.parse(msg, self.locations_string)
-
-        # Aggregate output in self.full_output: CodeFix needs to be looking at
-        # the whole output in one go.
-        self.full_output += msg + "\n"
+    def parse_output(self):
+        """
+        Parse the pending lines of output in one go, and add the
+        corresponding messages to the Locations view.
+        """
+        self.last_parse = time.time()
+        self.cancel_flush()
+        if not self.pending:
+            return
+
+        chunk = "\n".join(self.pending) + "\n"
+        self.pending = []
+
+        GPS.Console("Messages").write(chunk)
+        chunk = MISSING_COLON_RE.sub(r"\1:\2", chunk)
+        GPS.Locations.parse(chunk, self.locations_string)
+
+        # CodeFix needs to be looking at the whole output in one go
+        self.output_chunks.append(chunk)
 
     def on_match(self, process, matched, unmatched):
-        if unmatched == "\n":
-            GPS.Console("Messages").write(self.msg + unmatched)
-            self.parse_output(self.msg)
-            self.msg = ""
-        self.msg += matched
+        lines = (self.partial_line + unmatched + matched).split("\n")
+        self.partial_line = lines.pop()
+        self.pending.extend(line for line in lines if line)
+
+        if len(self.pending) >= CHUNK_LINES \
+           or time.time() - self.last_parse >= CHUNK_DELAY:
+            self.parse_output()
+        elif self.pending and self.flush_timeout is None:
+            # Do not wait for more output if gnatcheck goes quiet
+            self.flush_timeout = GPS.Timeout(
+                int(CHUNK_DELAY * 1000), self.on_flush_timeout)
+
+    def on_flush_timeout(self, timeout):
+        self.parse_output()
+
+    def cancel_flush(self):
+        """
+        Cancel the delayed parsing of the pending lines, if any
+        """
+        if self.flush_timeout is not None:
+            self.flush_timeout.remove()
+            self.flush_timeout = None
 
     def on_exit(self, process, status, remaining_output):
-        if self.msg != "":
-            GPS.Console("Messages").write(self.msg)
-            GPS.Locations.parse(self.msg, self.locations_string)
-            self.parse_output(self.msg)
-            self.msg = ""
+        if self.partial_line:
+            self.pending.append(self.partial_line)
+            self.partial_line = ""
+        self.parse_output()
 
-        if self.full_output:
+        if self.output_chunks:
             # There is a full output: run CodeFix.
-            GPS.Codefix.parse(self.locations_string, self.full_output)
+            GPS.Codefix.parse(
+                self.locations_string, "".join(self.output_chunks))
+            self.output_chunks = []
 
     def on_spawn(self, filestr, project, recursive):
         """
@@ -214,9 +255,16 @@ class gnatCheckProc:
         if GPS.Locations.list_categories().count(self.locations_string) > 0:
             GPS.Locations.remove_category(self.locations_string)
 
-        self.msg = ""
+        self.cancel_flush()
+        self.pending = []
+        self.partial_line = ""
+        self.last_parse = time.time()
+
+        # Match all the output available at once: the lines are split and
+        # parsed by chunks in on_match
         GPS.Process(
-            cmd, "^.+$",
+            cmd, ".+",
+            single_line_regexp=True,
             on_match=self.on_match,
             on_exit=self.on_exit,
             progress_regexp="^ *completed (\d*) out of (\d*) .*$",
@@ -234,7 +282,7 @@ class gnatCheckProc:
             if modified:
                 GPS.Project.root().recompute()
 
-        self.full_output = ""
+        self.output_chunks = []
         opts_project = project
         opts = opts_project.get_attribute_as_list(
             "switches", package="check", index="ada")
@@ -4,6 +4,7 @@ files.
 """
 
 import GPS
+import re
 import time
 import traceback
 
@@ -137,6 +138,42 @@ class OverlayStyle(object):
         else:
             buffer.apply_overlay(over, start, end)
 
+    def apply_ranges(self, buffer, ranges):
+        """
+        Apply the highlighting to several parts of the buffer at once. When
+        the style uses messages, this does not need to create any
+        `GPS.EditorLocation`.
+
+        :param GPS.EditorBuffer buffer: the buffer to highlight.
+        :param list ranges: a list of (line, column, length) tuples, where
+           column is the same as `GPS.EditorLocation.column` and length is
+           the number of columns to highlight.
+        """
+        over = self.__create_style(buffer)
+
+        if self.use_messages():
+            file = buffer.file()
+            for line, column, length in ranges:
+                msg = GPS.Message(
+                    category=self.name,
+                    file=file,
+                    line=line,
+                    column=column,
+                    text="",
+                    show_on_editor_side=True,
+                    show_in_locations=False)
+
+                if self.whole_line:
+                    msg.set_style(over)
+                else:
+                    msg.set_style(over, length)
+                self._messages.append(msg)
+
+        else:
+            for line, column, length in ranges:
+                start = buffer.at(line, column)
+                buffer.apply_overlay(over, start, start + (length - 1))
+
     def remove(self, start, end=None):
         """
         Remove the highlighting in whole or part of the buffer.
@@ -152,8 +189,8 @@ class OverlayStyle(object):
 
         if self.use_messages():
             # ??? Missing support for removing partial messages. When we do
-            # that, we can remove the call to remove() in start_highlight
-            # when appending the buffer to the list.
+            # that, we can remove the call to remove_messages() in
+            # start_highlight when appending the buffer to the list.
             if end is None:
                 tmp = []
                 file = buffer.file()
@@ -195,9 +232,20 @@ class Background_Highlighter(object):
     # This is only used when gobject is not available
     timeout_ms = 40
 
-    # Number of lines to process at each iteration
+    # Number of lines to process at each iteration. When time_budget_ms is
+    # set, this is only used until the cost of processing a line is known.
     batch_size = 20
 
+    # Maximum time in milliseconds spent in each iteration. The number of
+    # lines processed at each iteration is adapted to fit in that time,
+    # based on the time it took to process the previous lines. 0 to always
+    # process batch_size lines.
+    time_budget_ms = 10
+
+    # Maximum number of lines to process at each iteration, when
+    # time_budget_ms is set.
+    max_batch_size = 2000
+
     # If True, highlighting is always done in the
     # foreground. This is for testsuite purposes
     synchronous = False
@@ -211,6 +259,9 @@ class Background_Highlighter(object):
         self.highlighted_limit = 0
         self.initial_timeout = initial_timeout
 
+        self.__line_cost = None  # Running estimate of seconds per line
+        self.reset_stats()
+
         self.style = style
         GPS.Hook("before_exit_action_hook").add(self.__before_exit)
         GPS.Hook("file_closed").add(self.__on_file_closed)
@@ -238,6 +289,58 @@ class Background_Highlighter(object):
         self.stop_highlight()
         return True
 
+    def reset_stats(self):
+        """
+        Reset the statistics on the highlighting done so far: the number of
+        lines processed, the number of iterations (slices) and the time
+        spent in them.
+        """
+        self.lines_processed = 0
+        self.slices = 0
+        self.busy_time = 0.0
+        self.max_slice_duration = 0.0
+
+    def lines_per_second(self):
+        """
+        :return: the average number of lines processed per second, while
+           highlighting. 0 if nothing was processed yet.
+        :rtype: float
+        """
+        if self.busy_time == 0.0:
+            return 0.0
+        return self.lines_processed / self.busy_time
+
+    def __batch_lines(self):
+        """
+        :return: the number of lines to process in the next iteration
+        :rtype: integer
+        """
+        if not self.time_budget_ms or self.__line_cost is None:
+            return self.batch_size
+        return max(1, min(self.max_batch_size, int(
+            self.time_budget_ms / 1000.0 / self.__line_cost)))
+
+    def __record_slice(self, lines, duration):
+        """
+        Update the statistics and the estimated cost of a line after an
+        iteration.
+
+        :param integer lines: the number of lines processed
+        :param float duration: the time it took, in seconds
+        """
+        self.slices += 1
+        self.lines_processed += lines
+        self.busy_time += duration
+        self.max_slice_duration = max(self.max_slice_duration, duration)
+
+        if lines > 0:
+            cost = duration / lines
+            if self.__line_cost is None:
+                self.__line_cost = cost
+            else:
+                # Smooth the variations between parts of the buffer
+                self.__line_cost = 0.7 * self.__line_cost + 0.3 * cost
+
     def set_style(self, style):
         """
         Change the current highlight style.
@@ -298,8 +401,7 @@ class Background_Highlighter(object):
             self.__buffers.append(
                 (buffer, line, line + 1, start_line, end_line, True, 0))
 
-            if self.style and self.style.use_messages():
-                self.style.remove(buffer)
+            self.remove_messages(buffer)
 
             if self.synchronous:
                 self.on_start_buffer(buffer)
@@ -344,6 +446,17 @@ class Background_Highlighter(object):
         """
         pass
 
+    def remove_messages(self, buffer):
+        """
+        Called when the highlighting of buffer is restarted, to remove the
+        messages created by the previous highlighting, since they cannot be
+        removed range by range in process().
+
+        :param GPS.EditorBuffer buffer:
+        """
+        if self.style and self.style.use_messages():
+            self.style.remove(buffer)
+
     def stop_highlight(self, buffer=None):
         """
         Stop the background highlighting of the buffer, but preserves
@@ -416,9 +529,12 @@ class Background_Highlighter(object):
              self.highlighted) = self.__buffers[0]
 
             changed = False
+            slice_start = time.time()
+            batch_lines = self.__batch_lines()
+            lines = 0
 
             if min_line >= start_line and (backward or max_line >= end_line):
-                from_line = max(start_line, min_line - self.batch_size)
+                from_line = max(start_line, min_line - batch_lines)
 
                 f = buffer.at(from_line, 1)
 
@@ -429,6 +545,7 @@ class Background_Highlighter(object):
                         self.style.remove(f, e)
 
                     self.process(f, e)
+                    lines = min_line - from_line + 1
 
                 min_line = from_line - 1
                 if max_line < end_line:
@@ -436,7 +553,7 @@ class Background_Highlighter(object):
                 changed = True
 
             elif max_line < end_line:
-                to_line = min(end_line - 1, max_line + self.batch_size)
+                to_line = min(end_line - 1, max_line + batch_lines)
 
                 # It is possible that the buffer has been changed so that one
                 # of the locations is now invalid, so we just protect.
@@ -450,6 +567,7 @@ class Background_Highlighter(object):
                         if self.style:
                             self.style.remove(f, e)
                         self.process(f, e)
+                        lines = to_line - max_line + 1
 
                     max_line = to_line + 1
                     if min_line >= start_line:
@@ -458,6 +576,8 @@ class Background_Highlighter(object):
                 except Exception:
                     pass
 
+            self.__record_slice(lines, time.time() - slice_start)
+
             if changed and (self.highlighted_limit == 0 or
                             self.highlighted < self.highlighted_limit):
                 self.__buffers[0] = (
@@ -652,7 +772,162 @@ class Location_Highlighter(Background_Highlighter):
                             continue
 
 
-class Regexp_Highlighter(On_The_Fly_Highlighter):
+def _scan(highlighters, start, end):
+    """
+    Apply the style of each highlighter to the matches of its pattern
+    between start and end. The text of the range is only fetched once.
+
+    :param list(_Pattern_Highlighter) highlighters:
+    :param GPS.EditorLocation start: start of region to process.
+    :param GPS.EditorLocation end: end of region to process.
+    """
+    text = start.buffer().get_chars(start, end).decode("utf-8", "replace")
+    for h in highlighters:
+        for m in h.compiled.finditer(text):
+            if m.end() > m.start():
+                h.style.apply(start + m.start(), start + (m.end() - 1))
+
+
+class _Pattern_Scanner(On_The_Fly_Highlighter):
+
+    """
+    Scans the editors on behalf of all the Regexp_Highlighter and
+    Text_Highlighter, so that there is a single background job and each
+    range of lines is fetched once, whatever the number of highlighters.
+    """
+
+    def __init__(self):
+        self.clients = []
+        On_The_Fly_Highlighter.__init__(self, style=None)
+
+    def add(self, highlighter):
+        """
+        Start highlighting the open editors for highlighter.
+
+        :param _Pattern_Highlighter highlighter:
+        """
+        self.clients.append(highlighter)
+        self.context_lines = max(self.context_lines,
+                                 highlighter.context_lines)
+        for buf in GPS.EditorBuffer.list():
+            if highlighter.must_highlight(buf):
+                # Restart the buffer so that all its lines are processed
+                # for the new highlighter too
+                self.stop_highlight(buf)
+                self.start_highlight(buf)
+
+    def remove(self, highlighter):
+        """
+        Stop highlighting for highlighter.
+
+        :param _Pattern_Highlighter highlighter:
+        """
+        self.clients.remove(highlighter)
+
+    def must_highlight(self, buffer):  # overriding
+        for h in self.clients:
+            if h.must_highlight(buffer):
+                return True
+        return False
+
+    def remove_messages(self, buffer):  # overriding
+        for h in self.clients:
+            if h.style.use_messages() and h.must_highlight(buffer):
+                h.style.remove(buffer)
+
+    def process(self, start, end):  # overriding
+        buffer = start.buffer()
+        active = [h for h in self.clients if h.must_highlight(buffer)]
+        for h in active:
+            h.style.remove(start, end)
+        _scan(active, start, end)
+
+
+_scanner = None
+# The _Pattern_Scanner shared by all highlighters, created on first use
+
+
+class _Pattern_Highlighter(On_The_Fly_Highlighter):
+
+    """
+    Common implementation of Regexp_Highlighter and Text_Highlighter.
+    Unless process is overridden, the editors are scanned by the shared
+    _Pattern_Scanner rather than in a background job of our own.
+    """
+
+    # Whether to use the shared scanner
+    shared = True
+
+    def __init__(self, pattern, style, context_lines=0):
+        """
+        :param str pattern: a python regular expression equivalent to what
+           search() looks for, or None if there is none.
+        """
+        try:
+            # The text of editors is matched as unicode
+            if isinstance(pattern, str):
+                pattern = pattern.decode("utf-8")
+            self.compiled = re.compile(
+                pattern, re.IGNORECASE | re.MULTILINE | re.UNICODE)
+        except (re.error, TypeError, UnicodeDecodeError):
+            self.compiled = None
+        self.__in_scanner = False
+        On_The_Fly_Highlighter.__init__(
+            self, context_lines=context_lines, style=style)
+
+    def __use_scanner(self):
+        return (self.shared
+                and gobject_available
+                and not self.synchronous
+                and self.compiled is not None
+                and type(self).process.im_func is
+                _Pattern_Highlighter.process.im_func)
+
+    def start(self):  # overriding
+        global _scanner
+        if self.__use_scanner():
+            if _scanner is None:
+                _scanner = _Pattern_Scanner()
+            _scanner.add(self)
+            self.__in_scanner = True
+        else:
+            On_The_Fly_Highlighter.start(self)
+
+    def stop(self):  # overriding
+        if self.__in_scanner:
+            _scanner.remove(self)
+            self.__in_scanner = False
+            for buffer in GPS.EditorBuffer.list():
+                if self.must_highlight(buffer) and self.style:
+                    self.style.remove(buffer)
+        else:
+            On_The_Fly_Highlighter.stop(self)
+
+    def search(self, start):
+        """
+        Search for the next match from start, with GPS's search engine.
+        This is used when the pattern is not a valid python regular
+        expression.
+
+        :param GPS.EditorLocation start:
+        :return: the start and end of the match, or None
+        """
+        return None
+
+    def process(self, start, end):  # overriding
+        if self.compiled is not None:
+            _scan([self], start, end)
+            return
+
+        while True:
+            start = self.search(start)
+            if not start or start[0] > end:
+                return
+            self.style.apply(start[0], start[1] - 1)
+            start = start[1] + 1
+
+
+class Regexp_Highlighter(_Pattern_Highlighter):
 
     """
     The Regexp_Highlighter is a concrete implementation to highlight
@@ -699,20 +974,15 @@ class Regexp_Highlighter(On_The_Fly_Highlighter):
 
     def __init__(self, regexp, style, context_lines=0):
         self.regexp = regexp
-        On_The_Fly_Highlighter.__init__(
-            self, context_lines=context_lines, style=style)
+        _Pattern_Highlighter.__init__(
+            self, regexp, context_lines=context_lines, style=style)
 
-    def process(self, start, end):
-        while True:
-            start = start.search(
-                self.regexp, regexp=True, dialog_on_failure=False)
-            if not start or start[0] > end:
-                return
-            self.style.apply(start[0], start[1] - 1)
-            start = start[1] + 1
+    def search(self, start):  # overriding
+        return start.search(
+            self.regexp, regexp=True, dialog_on_failure=False)
 
 
-class Text_Highlighter(On_The_Fly_Highlighter):
+class Text_Highlighter(_Pattern_Highlighter):
 
     """
     Similar to Regexp_Highlighter, but highlights constant text instead of
@@ -730,15 +1000,15 @@ class Text_Highlighter(On_The_Fly_Highlighter):
     def __init__(self, text, style, whole_word=False, context_lines=0):
         self.text = text
         self.whole_word = whole_word
-        On_The_Fly_Highlighter.__init__(
-            self, context_lines=context_lines, style=style)
 
-    def process(self, start, end):
-        while True:
-            start = start.search(
-                self.text, regexp=False, dialog_on_failure=False,
-                whole_word=self.whole_word)
-            if not start or start[0] > end:
-                return
-            self.style.apply(start[0], start[1] - 1)
-            start = start[1] + 1
+        pattern = re.escape(text)
+        if whole_word:
+            pattern = r"(?<!\w)" + pattern + r"(?!\w)"
+
+        _Pattern_Highlighter.__init__(
+            self, pattern, context_lines=context_lines, style=style)
+
+    def search(self, start):  # overriding
+        return start.search(
+            self.text, regexp=False, dialog_on_failure=False,
+            whole_word=self.whole_word)
@@ -6,7 +6,6 @@ import os
 import libadalang
 from modules import Module
 from gi.repository import Gtk, Gdk, GLib, Pango
-from gps_utils import make_interactive
 
 COL_LABEL = 0
 COL_FOREGROUND = 1
@@ -310,16 +309,12 @@ class LAL_View(Module):
     view_title = "Libadalang"
     mdi_position = GPS.MDI.POSITION_RIGHT
     mdi_group = GPS.MDI.GROUP_DEBUGGER_STACK
+    activate_on_actions = {"open Libadalang": ("get_view", "Views")}
 
     def __init__(self):
         self.widget = None
 
     def setup(self):
-        # Create an "open Libadalang" action
-        make_interactive(
-            self.get_view,
-            category="Views",
-            name="open Libadalang")
         GPS.Hook("location_changed").add_debounce(
             self.location_changed_debounced)
 
@@ -39,6 +39,17 @@ Here is an example of use for this package::
     def on_view_destroy(self):
         self.stored_something = None
 
+A module can also be set up only when it is first needed, rather than when
+GPS starts, by declaring the triggers that activate it::
+
+  class My_Lazy_Module(Module):
+    activate_on_languages = ("c", "cpp")
+    activate_on_actions = {"open my view": ("get_view", "Views")}
+
+    def setup(self):
+        # The "open my view" action is created by the module itself
+        pass
+
 Sometimes, the module is wrapping an GPS.GUI object that has been created
 by GPS itself (for instance a :class:`GPS.Browsers.View`). Since
 :func:`GPS.Browsers.View.create` is putting the view directly in the MDI,
@@ -50,7 +61,9 @@ underscore) as a parameter to :func:`GPS.Browsers.View.create`.
 
 
 import GPS
+import time
 import traceback
+import types
 import sys
 
 try:
@@ -74,6 +87,10 @@ class Module_Metaclass(type):
     modules = []
     modules_instances = []
 
+    setup_costs = []
+    # The (name, seconds) spent in the setup of each module, in the order
+    # they were set up
+
     def __new__(cls, name, bases, attrs):
         new_class = type.__new__(cls, name, bases, attrs)
 
@@ -85,7 +102,7 @@ class Module_Metaclass(type):
             if Module_Metaclass.gps_started:
                 inst = new_class()
                 Module_Metaclass.modules_instances.append(inst)
-                GLib.idle_add(lambda: inst._setup())
+                GLib.idle_add(lambda: inst._activate())
 
                 # Simulate running the gps_started hook
                 pref = getattr(inst, "gps_started", None)
@@ -101,7 +118,28 @@ class Module_Metaclass(type):
             for ModuleClass in Module_Metaclass.modules:
                 inst = ModuleClass()
                 Module_Metaclass.modules_instances.append(inst)
-                inst._setup()
+                inst._activate()
+
+            GPS.Logger('MODULES.SETUP').log(
+                "Modules set up when GPS started:\n%s" % (
+                    Module_Metaclass.setup_report(), ))
+
+    @staticmethod
+    def setup_report():
+        """
+        Return a description of the time spent in the setup of each module,
+        costliest first, followed by the modules not set up yet.
+
+        :rtype: str
+        """
+        costs = sorted(Module_Metaclass.setup_costs, key=lambda c: -c[1])
+        lines = ["%8.1f ms  %s" % (cost * 1000, name) for name, cost in costs]
+        lines.append("%8.1f ms  total" % (
+            sum(cost for _, cost in costs) * 1000, ))
+        lines.extend("%8s     %s" % ("deferred", inst.name())
+                     for inst in Module_Metaclass.modules_instances
+                     if not inst.is_active())
+        return "\n".join(lines)
 
     @staticmethod
     def load_desktop(name, data):
@@ -152,6 +190,25 @@ class Module(object):
     # of the hooks below, that function will automatically be connected to
     # the hook (and disconnected when the module is teared down.
 
+    activate_on_languages = ()
+    # When any of the activate_on_* attributes is set, the module is not set
+    # up when GPS starts, but the first time one of these triggers occurs:
+    # the project uses one of these languages (lowercase names)...
+
+    activate_on_hooks = ()
+    # ... one of these hooks is run. These should be hooks that do not
+    # expect a return value ...
+
+    activate_on_actions = {}
+    # ... one of these actions is executed. This maps the name of each
+    # action to the name of the method of the module that executes it and
+    # to the category of the action. These actions are created by the module
+    # when GPS starts, and must not be created again by setup() ...
+
+    activate_on_views = ()
+    # ... or one of these views is opened. The view of the module always
+    # activates it, including when restored from the desktop.
+
     mdi_position = GPS.MDI.POSITION_BOTTOM
     # the initial position of the window in the MDI (see GPS.MDI.add)
 
@@ -304,6 +361,89 @@ class Module(object):
         if p:
             GPS.Hook(hook_name).remove(p)
 
+    #########################################
+    # Activation
+    #########################################
+
+    __active = False
+    # Whether setup() has been called
+
+    __triggers = ()
+    # The (hook name, callback) that activate the module
+
+    def is_active(self):
+        """
+        Whether the module has been set up
+
+        :rtype: bool
+        """
+        return self.__active
+
+    def __is_lazy(self):
+        return bool(self.activate_on_languages or
+                    self.activate_on_hooks or
+                    self.activate_on_actions or
+                    self.activate_on_views)
+
+    def __uses_languages(self):
+        """
+        Whether the project uses one of the languages of the module
+        """
+        if not self.activate_on_languages:
+            return False
+        languages = GPS.Project.root().languages(recursive=True)
+        return any(lang in languages for lang in self.activate_on_languages)
+
+    def _activate(self):
+        """
+        Set up the module now, unless it declares triggers which have not
+        occurred yet, in which case the setup is deferred until they do.
+        """
+        for name, (method, category) in self.activate_on_actions.items():
+            action = GPS.Action(name)
+            if not action.exists():
+                action.create(
+                    lambda method=method: self.__on_action(method),
+                    category=category,
+                    description=(getattr(self, method).__doc__ or '').strip())
+
+        if not self.__is_lazy() or self.__uses_languages():
+            self._setup()
+            return
+
+        def on_hook(hook, *args, **kwargs):
+            self._setup()
+
+        def on_project_view_changed(hook):
+            if self.__uses_languages():
+                self._setup()
+
+        def on_mdi_child_selected(hook, child):
+            if child and (child.name() in self.activate_on_views or
+                          child.name(short=True) in self.activate_on_views):
+                self._setup()
+
+        triggers = [(h, on_hook) for h in self.activate_on_hooks]
+        if self.activate_on_languages:
+            triggers.append(("project_view_changed", on_project_view_changed))
+        if self.activate_on_views:
+            triggers.append(("mdi_child_selected", on_mdi_child_selected))
+
+        self.__triggers = triggers
+        for hook_name, callback in triggers:
+            GPS.Hook(hook_name).add(callback)
+
+    def __on_action(self, method):
+        """
+        Called when an action of activate_on_actions is executed: set up the
+        module if needed, then call its method.
+        """
+        self._setup()
+        r = getattr(self, method)()
+        if isinstance(r, types.GeneratorType):
+            import workflows
+            workflows.driver(r)  # Execute the generator
+
     #########################################
     # Views
     #########################################
@@ -312,6 +452,15 @@ class Module(object):
         """
         Internal version of setup
         """
+        if self.__active:
+            return
+
+        self.__active = True
+        for hook_name, callback in self.__triggers:
+            GPS.Hook(hook_name).remove(callback)
+        self.__triggers = ()
+
+        start = time.time()
 
         self.__connect_hooks()
         if not self.view_title:
@@ -338,10 +487,14 @@ class Module(object):
                 " you should override 'setup'\n." % (
                     self.__module__, self.__class__.__name__))
 
+        Module_Metaclass.setup_costs.append(
+            (self.name(), time.time() - start))
+
     def _teardown(self):
         for h in self.auto_connect_hooks:
             self.__disconnect_hook(h)
         self.teardown()
+        self.__active = False
 
     def name(self):
         """
@@ -354,6 +507,7 @@ class Module(object):
 
     def _load_desktop(self, name, data):
         if name == self.name():
+            self._setup()
             try:
                 c = self.load_desktop(data)
                 if not c:
@@ -380,6 +534,7 @@ class Module(object):
                 child.raise_window()
                 return child
             elif allow_create:
+                self._setup()
                 view = self.create_view()
                 if view:
                     # The following has no effect if create_view has already
@@ -0,0 +1,151 @@
+"""
+An optional on-disk cache of the highlighting of large files.
+
+When a file has been completely highlighted, the tags applied to it and the
+highlighter stacks of its lines are saved in the highlighter_cache directory
+of the GPS home directory. When a file with the same contents is opened again
+with the same highlighter, its highlighting is restored from the cache instead
+of lexing the whole file.
+
+Entries are keyed by the hash of the contents of the file and the hash of the
+highlighter spec. The least recently used entries are removed when the cache
+grows beyond the size set in the preferences.
+"""
+
+import GPS
+import hashlib
+import json
+import os
+import zlib
+
+CACHE_SIZE_PREF = "Editor/highlighter-cache-size"
+
+MIN_LINES = 2000
+# Files with fewer lines are fast enough to lex, and are not cached
+
+FORMAT_VERSION = 1
+# To be incremented whenever the format of the entries changes
+
+GPS.Preference(CACHE_SIZE_PREF).create(
+    "Highlighting cache size", "integer",
+    "Maximum size in megabytes of the on-disk cache of the highlighting of"
+    " large files, so that reopening them does not require to highlight them"
+    " again. 0 disables the cache.",
+    50, 0, 10000)
+
+
+def cache_dir():
+    """
+    Return the directory where the entries are stored
+
+    :rtype: str
+    """
+    return os.path.join(GPS.get_home_dir(), "highlighter_cache")
+
+
+def max_size():
+    """
+    Return the maximum size of the cache in bytes, 0 if the cache is disabled
+
+    :rtype: int
+    """
+    return GPS.Preference(CACHE_SIZE_PREF).get() * 1024 * 1024
+
+
+def is_enabled(line_count):
+    """
+    Whether the highlighting of a buffer with line_count lines should go
+    through the cache.
+
+    :type line_count: int
+    :rtype: bool
+    """
+    return line_count >= MIN_LINES and max_size() > 0
+
+
+def key(spec_hash, text):
+    """
+    Return the key of the entry for a file
+
+    :param str spec_hash: The hash of the highlighter spec
+    :param str text: The contents of the file, encoded in utf-8
+    :rtype: str
+    """
+    h = hashlib.sha1(spec_hash)
+    h.update(text)
+    return h.hexdigest()
+
+
+def __entry_path(entry_key):
+    return os.path.join(cache_dir(), entry_key + ".json.z")
+
+
+def load(entry_key):
+    """
+    Return the entry stored for entry_key, or None if there is none.
+
+    :rtype: dict|None
+    """
+    path = __entry_path(entry_key)
+    try:
+        with open(path, "rb") as f:
+            entry = json.loads(zlib.decompress(f.read()))
+
+        # Mark the entry as recently used
+        os.utime(path, None)
+
+    except (IOError, OSError, ValueError, zlib.error):
+        return None
+
+    if entry.get("version") != FORMAT_VERSION:
+        return None
+
+    return entry
+
+
+def save(entry_key, entry):
+    """
+    Store entry for entry_key, and remove the least recently used entries
+    if the cache has grown too large.
+
+    :type entry: dict
+    """
+    entry["version"] = FORMAT_VERSION
+    directory = cache_dir()
+
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        path = __entry_path(entry_key)
+        with open(path + ".tmp", "wb") as f:
+            f.write(zlib.compress(json.dumps(entry, separators=(",", ":"))))
+        os.rename(path + ".tmp", path)
+
+        __evict(directory, max_size())
+
+    except (IOError, OSError) as e:
+        GPS.Logger("HIGHLIGHTER").log(
+            "Could not save highlighting cache: {0}".format(e))
+
+
+def __evict(directory, size):
+    """
+    Remove the least recently used entries until the cache is smaller than
+    size. Temporary files left by an interrupted save are removed as well.
+    """
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith(".tmp"):
+            os.remove(path)
+            continue
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(entry_size for _, entry_size, _ in entries)
+    for _, entry_size, path in sorted(entries):
+        if total <= size:
+            break
+        os.remove(path)
+        total -= entry_size
@@ -4,17 +4,24 @@ from modules import Module
 try:
     # While building the doc, we might not have gi.repository
     from gi.repository import Gtk, GLib, Gdk, Pango
-    from pygps import get_gtk_buffer, is_editor_visible
+    from pygps import get_gtk_buffer, is_editor_visible, \
+        get_widgets_by_type
 except ImportError:
     pass
 
+from array import array
+from highlighter import cache
+import hashlib
 import re
+import time
 
 
 class HighlighterModule(Module):
     highlighters = {}
     preferences = {}
 
+    auto_connect_hooks = Module.auto_connect_hooks + ("file_closed", )
+
     def init_highlighting(self, f):
         highlighter = self.highlighters.get(f.language(), None)
         if isinstance(highlighter, Highlighter):
@@ -23,7 +30,7 @@ class HighlighterModule(Module):
                 gtk_ed = get_gtk_buffer(ed)
                 if not gtk_ed.highlighting_initialized:
                     highlighter.init_highlighting(ed)
-                    highlighter.gtk_highlight(gtk_ed)
+                    highlighter.gtk_highlight(gtk_ed, visible_lines(ed))
 
     def setup(self):
         for ed in GPS.EditorBuffer.list():
@@ -48,6 +55,14 @@ class HighlighterModule(Module):
         """
         self.init_highlighting(f)
 
+    def file_closed(self, f):
+        """
+        Stop the background highlighting of the closed editor, if any
+        """
+        for highlighter, gtk_ed in list(idle_highlighted.values()):
+            if gtk_ed.gps_file == f:
+                highlighter.cancel_idle_highlight(gtk_ed)
+
 
 #############
 # Utilities #
@@ -55,6 +70,10 @@ class HighlighterModule(Module):
 
 null_span = (-1, -1)
 
+idle_highlighted = {}
+# The buffers being highlighted in the background: id of the buffer ->
+# (highlighter, buffer)
+
 
 def to_tuple(gtk_iter):
     """
@@ -79,6 +98,35 @@ def iter_from_tuple(gtk_ed, tuple_instance):
     return gtk_ed.get_iter_at_line_index(*tuple_instance)
 
 
+def visible_lines(ed):
+    """
+    Return the range of lines visible in the current view of ed. If the view
+    has not been allocated yet, return the line of the cursor, and the first
+    line if there is no view.
+
+    :type ed: GPS.EditorBuffer
+    :rtype: (int, int)
+    """
+    view = ed.current_view()
+    if view is None:
+        return (0, 0)
+
+    text_views = get_widgets_by_type(Gtk.TextView, view.pywidget())
+    if not text_views:
+        return (0, 0)
+
+    gtk_tv = text_views[0]
+    rect = gtk_tv.get_visible_rect()
+
+    if rect.height > 1:
+        return (gtk_tv.get_line_at_y(rect.y)[0].get_line(),
+                gtk_tv.get_line_at_y(rect.y + rect.height)[0].get_line())
+
+    gtk_ed = gtk_tv.get_buffer()
+    line = gtk_ed.get_iter_at_mark(gtk_ed.get_insert()).get_line()
+    return (line, line)
+
+
 def iter_to_str(gtk_iter):
     """
     Return a better string representation of a text iter
@@ -290,11 +338,38 @@ class RegionRef(BaseMatcher):
 
 
 class HighlighterStacks(object):
+    """
+    The stacks of highlighters at the beginning of each line of a buffer.
+
+    The distinct stacks are interned, and each line only stores the small
+    integer identifying its stack in a compact array, so that lines can be
+    inserted or deleted by whole ranges in a single operation.
+    """
 
     def __init__(self):
+        # Interned stacks: the identifier of a stack is its index in
+        # self.stacks. The empty stack is always interned as 0.
+        self.stacks = [()]
+        self.stack_ids = {(): 0}
+
         # The stack of highlighter at (0, 0) is necessarily the empty stack,
-        # so the stack list comes prepopulated with one empty stack
-        self.stacks_list = [()]
+        # so the list of lines comes prepopulated with one empty stack
+        self.lines = array('i', [0])
+
+    def intern(self, stack):
+        """
+        Return the identifier of stack, interning it if needed.
+
+        :type stack: Iterable[Struct]
+        :rtype: int
+        """
+        tpstack = tuple(stack)
+        stack_id = self.stack_ids.get(tpstack)
+        if stack_id is None:
+            stack_id = len(self.stacks)
+            self.stacks.append(tpstack)
+            self.stack_ids[tpstack] = stack_id
+        return stack_id
 
     def set(self, index, stack):
         """
@@ -305,24 +380,42 @@ class HighlighterStacks(object):
         :type stack: tuple[Struct]
         @rtype:      bool
         """
-        assert 0 <= index <= len(self.stacks_list)
+        assert 0 <= index <= len(self.lines)
 
-        tpstack = tuple(stack)
-        if index == len(self.stacks_list):
-            self.stacks_list.append(tpstack)
+        stack_id = self.intern(stack)
+        if index == len(self.lines):
+            self.lines.append(stack_id)
             return False
         else:
-            current_stack = self.stacks_list[index]
-            self.stacks_list[index] = tpstack
-            return tpstack == current_stack
+            current_id = self.lines[index]
+            self.lines[index] = stack_id
+            return stack_id == current_id
+
+    def set_range(self, first_line, last_line, stack):
+        """
+        Set the stack of highlighters for all lines from first_line to
+        last_line included.
+
+        :type first_line: int
+        :type last_line: int
+        :type stack: tuple[Struct]
+        """
+        assert 0 <= first_line <= len(self.lines)
+
+        if last_line < first_line:
+            return
+
+        stack_id = self.intern(stack)
+        self.lines[first_line:last_line + 1] = array(
+            'i', [stack_id]) * (last_line - first_line + 1)
 
     def get(self, start_line):
         """
         :type start_line: int
         @rtype:           tuple[Struct]|None
         """
-        if start_line < len(self.stacks_list):
-            return self.stacks_list[start_line][:]
+        if start_line < len(self.lines):
+            return self.stacks[self.lines[start_line]]
         else:
             return None
 
@@ -331,20 +424,45 @@ class HighlighterStacks(object):
         :type after_line: int
         :type nb_lines:   int
         """
-        for _ in range(nb_lines):
-            self.stacks_list.insert(after_line + 1, ())
+        if nb_lines > 0:
+            self.lines[after_line + 1:after_line + 1] = array(
+                'i', [0]) * nb_lines
 
     def delete_lines(self, nb_deleted_lines, at_line):
         """
         :param nb_deleted_lines: int
         :param at_line: int
         """
-        del self.stacks_list[at_line + 1:at_line + nb_deleted_lines + 1]
+        del self.lines[at_line + 1:at_line + nb_deleted_lines + 1]
+
+    def dump(self, indexes):
+        """
+        Return a representation of the stacks made of lists of integers.
+
+        :param dict[SubHighlighter, int] indexes: The integer to use for
+          each SubHighlighter.
+        :rtype: (list[list[int]], list[int])
+        """
+        return ([[indexes[hl] for hl in stack] for stack in self.stacks],
+                self.lines.tolist())
+
+    def load(self, sub_highlighters, stacks, lines):
+        """
+        Restore the stacks returned by dump.
+
+        :param list[SubHighlighter] sub_highlighters: The SubHighlighter
+          for each integer.
+        """
+        self.stacks = [tuple(sub_highlighters[i] for i in stack)
+                       for stack in stacks]
+        self.stack_ids = dict((stack, stack_id)
+                              for stack_id, stack in enumerate(self.stacks))
+        self.lines = array('i', lines)
 
     def __str__(self):
         return "{0}".format(
-            "\n".join(["{0}\t{1}".format(num, [c for c in stack])
-                       for num, stack in enumerate(self.stacks_list)])
+            "\n".join(["{0}\t{1}".format(num, list(self.stacks[stack_id]))
+                       for num, stack_id in enumerate(self.lines)])
         )
 
 
@@ -363,11 +481,19 @@ class SubHighlighter(object):
             patterns.append(stop_pattern)
             self.matchers.append(None)
 
+        flags = re.M + (re.S if matchall else 0) + (re.I if igncase else 0)
         self.pattern = re.compile(
-            "|".join("({0})".format(pat) for pat in patterns),
-            flags=re.M + (re.S if matchall else 0) +
-            (re.I if igncase else 0)
-        )
+            "|".join("({0})".format(pat) for pat in patterns), flags=flags)
+
+        # Each pattern is wrapped in a group, which is always the last group
+        # to be closed when the pattern matches. The index of the matcher can
+        # then be found directly from the lastindex of the match, even when
+        # the patterns contain groups of their own.
+        self.matcher_index = [None] * (self.pattern.groups + 1)
+        group = 1
+        for i, pat in enumerate(patterns):
+            self.matcher_index[group] = i
+            group += re.compile(pat, flags).groups + 1
         self.gtk_tag = None
         self.region_start = None
         self.parent_cat = None
@@ -386,25 +512,336 @@ class SubHighlighter(object):
         return self.__str__()
 
 
+def interval_difference(intervals, others):
+    """
+    Return the parts of intervals that are not covered by others. Both lists
+    must be sorted and made of disjoint (start, end) tuples.
+
+    :type intervals: list[(int, int)]
+    :type others: list[(int, int)]
+    :rtype: list[(int, int)]
+    """
+    result = []
+    j = 0
+    for start, end in intervals:
+        while j < len(others) and others[j][1] <= start:
+            j += 1
+
+        k = j
+        current = start
+        while k < len(others) and others[k][0] < end:
+            if others[k][0] > current:
+                result.append((current, others[k][0]))
+            current = max(current, others[k][1])
+            k += 1
+
+        if current < end:
+            result.append((current, end))
+
+    return result
+
+
+def merge_intervals(intervals):
+    """
+    Sort intervals and merge the ones that overlap or touch
+
+    :type intervals: list[(int, int)]
+    :rtype: list[(int, int)]
+    """
+    result = []
+    for start, end in sorted(intervals):
+        if result and start <= result[-1][1]:
+            if end > result[-1][1]:
+                result[-1] = (result[-1][0], end)
+        else:
+            result.append((start, end))
+    return result
+
+
 class Highlighter(object):
 
-    def __init__(self, spec=(), igncase=False, nb_lines=100):
+    def __init__(self, spec=(), igncase=False, nb_lines=100,
+                 incremental=True, lazy=True, idle_time_budget=20):
         """
         :type spec: Iterable[BaseMatcher]
+        :param bool incremental: Whether modifications should be handled in
+          damage-tracking mode: the buffer is re-lexed from the modified line
+          until the highlighter stacks re-synchronize, and only the tags that
+          changed are updated in the buffer.
+        :param bool lazy: Whether opening a buffer should only highlight the
+          visible lines right away, and highlight the rest of the buffer in
+          the background.
+        :param int idle_time_budget: In lazy mode, the time in milliseconds
+          after which the background highlighting yields to the main loop.
         :return:
         """
         self.root_highlighter = SubHighlighter(spec, igncase=igncase)
         self.sync_stop = False
-        # Nb lines we will rehighlight after a modification
+        # Nb lines we will rehighlight after a modification. In incremental
+        # mode, this is the size of the chunks the buffer is re-lexed by.
         self.nb_lines = nb_lines
+        self.incremental = incremental
+        self.lazy = lazy
+        self.idle_time_budget = idle_time_budget
+        self.__style_ids = None
+        self.__sub_highlighters = None
+        self.__spec_hash = None
+
+    def sub_highlighters(self):
+        """
+        Return the root highlighter and the highlighters of all the regions
+        reachable from it, always in the same order.
 
-    def highlight_info_gen(self, gtk_ed, start_line, end_line=0):
+        :rtype: list[SubHighlighter]
+        """
+        if self.__sub_highlighters is None:
+            self.__sub_highlighters = [self.root_highlighter]
+            visited = set(self.__sub_highlighters)
+
+            for hl in self.__sub_highlighters:
+                for matcher in hl.matchers:
+                    if (isinstance(matcher, RegionMatcher)
+                            and matcher.subhighlighter not in visited):
+                        visited.add(matcher.subhighlighter)
+                        self.__sub_highlighters.append(matcher.subhighlighter)
+
+        return self.__sub_highlighters
+
+    def style_ids(self):
+        """
+        Return the names of all the tags this highlighter can apply
+
+        :rtype: set[string]
+        """
+        if self.__style_ids is None:
+            self.__style_ids = set(
+                matcher.tag.style_id
+                for hl in self.sub_highlighters()
+                for matcher in hl.matchers if matcher and matcher.tag)
+
+        return self.__style_ids
+
+    def spec_hash(self):
+        """
+        Return a hash of the spec of this highlighter, identifying the cache
+        entries computed with it.
+
+        :rtype: str
+        """
+        if self.__spec_hash is None:
+            self.__spec_hash = hashlib.sha1(u"\n".join(
+                u"{0} {1} {2}".format(
+                    hl.pattern.pattern, hl.pattern.flags,
+                    [m.tag.style_id if m and m.tag else None
+                     for m in hl.matchers])
+                for hl in self.sub_highlighters()).encode("utf-8")
+            ).hexdigest()
+
+        return self.__spec_hash
+
+    def existing_tags(self, gtk_ed, start_offset, end_offset):
+        """
+        Return the ranges covered by the tags of this highlighter between
+        start_offset and end_offset, as they currently are in the buffer.
+
+        :type gtk_ed: Gtk.TextBuffer
+        :rtype: dict[string, list[(int, int)]]
+        """
+        style_ids = self.style_ids()
+        ranges = {}
+        opened = {}
+
+        it = gtk_ed.get_iter_at_offset(start_offset)
+        for tag in it.get_tags():
+            if tag.props.name in style_ids:
+                opened[tag.props.name] = start_offset
+
+        while it.forward_to_tag_toggle(None):
+            offset = it.get_offset()
+            if offset >= end_offset:
+                break
+
+            for tag in it.get_toggled_tags(False):
+                start = opened.pop(tag.props.name, None)
+                if start is not None:
+                    ranges.setdefault(tag.props.name, []).append(
+                        (start, offset))
+
+            for tag in it.get_toggled_tags(True):
+                if tag.props.name in style_ids:
+                    opened[tag.props.name] = offset
+
+        for name, start in opened.items():
+            ranges.setdefault(name, []).append((start, end_offset))
+
+        return ranges
+
+    def apply_changed_tags(self, gtk_ed, start_offset, actions_list):
+        """
+        Compare the tags computed by highlight_info_gen with the ones
+        already in the buffer, and only remove or apply the differences.
+
+        Returns the ranges covered by each tag, as computed by
+        tag_ranges.
+
+        :type gtk_ed: Gtk.TextBuffer
+        :param int start_offset: The offset at which the lexing started
+        :param actions_list: The result of highlight_info_gen
+        :rtype: dict[string, list[(int, int)]]
+        """
+        end_offset = actions_list[-1][2]
+        tags = {}
+        new_ranges = self.tag_ranges(actions_list, start_offset, tags)
+        old_ranges = self.existing_tags(gtk_ed, start_offset, end_offset)
+        start_it = gtk_ed.get_start_iter()
+        end_it = gtk_ed.get_start_iter()
+
+        for name in set(old_ranges) | set(new_ranges):
+            old = old_ranges.get(name, [])
+            new = new_ranges.get(name, [])
+            if old == new:
+                continue
+
+            tag = tags.get(name) or gtk_ed.get_tag_table().lookup(name)
+
+            for start, end in interval_difference(old, new):
+                start_it.set_offset(start)
+                end_it.set_offset(end)
+                gtk_ed.remove_tag(tag, start_it, end_it)
+
+            for start, end in interval_difference(new, old):
+                start_it.set_offset(start)
+                end_it.set_offset(end)
+                gtk_ed.apply_tag(tag, start_it, end_it)
+
+        return new_ranges
+
+    def tag_ranges(self, actions_list, start_offset, tags=None):
+        """
+        Return the sorted, merged ranges covered by each tag in the result of
+        highlight_info_gen, clipped to the lexed range.
+
+        :param int start_offset: The offset at which the lexing started
+        :param dict[string, Gtk.TextTag] tags: If given, filled with the
+          tag for each name.
+        :rtype: dict[string, list[(int, int)]]
+        """
+        end_offset = actions_list[-1][2]
+        ranges = {}
+
+        for tag, start, end in actions_list:
+            start, end = max(start, start_offset), min(end, end_offset)
+            if tag and start < end:
+                name = tag.props.name
+                if tags is not None:
+                    tags[name] = tag
+                ranges.setdefault(name, []).append((start, end))
+
+        for name in ranges:
+            ranges[name] = merge_intervals(ranges[name])
+
+        return ranges
+
+    def record_tag_ranges(self, gtk_ed, ranges):
+        """
+        Record ranges for the cache entry being built for gtk_ed, if any
+
+        :type gtk_ed: Gtk.TextBuffer
+        :type ranges: dict[string, list[(int, int)]]
+        """
+        if gtk_ed.cache_ranges is not None:
+            for name, intervals in ranges.items():
+                flat = gtk_ed.cache_ranges.setdefault(name, array('i'))
+                for start, end in intervals:
+                    flat.append(start)
+                    flat.append(end)
+
+    def save_to_cache(self, gtk_ed):
+        """
+        Save the highlighting of gtk_ed in the on-disk cache, if it has been
+        recorded.
+
+        :type gtk_ed: Gtk.TextBuffer
+        """
+        if gtk_ed.cache_ranges is not None and gtk_ed.cache_key:
+            indexes = dict((hl, i) for i, hl
+                           in enumerate(self.sub_highlighters()))
+            stacks, lines = gtk_ed.stacks.dump(indexes)
+            cache.save(gtk_ed.cache_key, {
+                "stacks": stacks,
+                "lines": lines,
+                "tags": dict((name, flat.tolist()) for name, flat
+                             in gtk_ed.cache_ranges.items())})
+
+        gtk_ed.cache_ranges = None
+        gtk_ed.cache_key = None
+
+    def restore_from_cache(self, gtk_ed):
+        """
+        Restore the highlighting of gtk_ed from the on-disk cache, without
+        lexing it. Returns whether an entry was found.
+
+        :type gtk_ed: Gtk.TextBuffer
+        :rtype: bool
+        """
+        entry = cache.load(gtk_ed.cache_key)
+        if entry is None or len(entry["lines"]) != gtk_ed.get_line_count():
+            return False
+
+        sub_highlighters = self.sub_highlighters()
+        gtk_ed.stacks.load(sub_highlighters, entry["stacks"], entry["lines"])
+
+        tags = {}
+        for hl in sub_highlighters:
+            for tag in hl.get_tags_list(gtk_ed):
+                if tag:
+                    tags[tag.props.name] = tag
+
+        start_it = gtk_ed.get_start_iter()
+        end_it = gtk_ed.get_start_iter()
+        for name, flat in entry["tags"].items():
+            tag = tags.get(name)
+            if tag:
+                for i in range(0, len(flat), 2):
+                    start_it.set_offset(flat[i])
+                    end_it.set_offset(flat[i + 1])
+                    gtk_ed.apply_tag(tag, start_it, end_it)
+
+        return True
+
+    def highlight_damaged(self, gtk_ed, start_line, nb_lines):
+        """
+        Re-lex the buffer from start_line, by chunks of nb_lines lines, until
+        the highlighter stacks re-synchronize with the ones computed before
+        the modification, and only update the tags that changed.
+
+        :type gtk_ed: Gtk.TextBuffer
+        :type start_line: int
+        :type nb_lines: int
+        """
+        line_count = gtk_ed.get_line_count()
+
+        while True:
+            end_line = start_line + nb_lines
+            start_offset = gtk_ed.get_iter_at_line(start_line).get_offset()
+            actions_list = self.highlight_info_gen(gtk_ed, start_line,
+                                                   end_line)
+            self.apply_changed_tags(gtk_ed, start_offset, actions_list)
+
+            if self.sync_stop or end_line >= line_count:
+                break
+
+            start_line = end_line
+
+    def highlight_info_gen(self, gtk_ed, start_line, end_line=0, sync=True):
         """
         Returns a generator that will highlight the buffer, one token at a
         time, every time the generator is consumed.
 
         :type gtk_ed: Gtk.TextBuffer
         :type start_line: int
+        :param bool sync: Whether to stop as soon as the stack of a line is
+          the same as the one previously computed for it.
         """
         self.sync_stop = False
 
@@ -450,11 +887,11 @@ class Highlighter(object):
 
             for m in matches:
 
-                # Get the index of the first matching category
-                i = [j for j in range(1, len(hl.matchers) + 1)
-                     if m.span(j) != null_span][0]
+                # Get the index of the matching category
+                i = m.lastindex
+                matcher_index = hl.matcher_index[i]
 
-                matcher, tag = hl.matchers[i - 1], tags[i - 1]
+                matcher, tag = hl.matchers[matcher_index], tags[matcher_index]
                 start_line += strn.count("\n",
                                          last_start_offset, m.start(i))
                 last_start_offset = m.start(i)
@@ -462,13 +899,13 @@ class Highlighter(object):
                 tk_end_offset = start_offset + m.end(i)
 
                 if start_line > current_line:
-                    for l in range(current_line + 1, start_line):
-                        gtk_ed.stacks.set(l, subhl_stack)
+                    gtk_ed.stacks.set_range(current_line + 1, start_line - 1,
+                                            subhl_stack)
                     current_line = start_line
 
                     # We exit because the stack we're setting is == to the
                     # existing one, so the buffer is synced
-                    if gtk_ed.stacks.set(current_line, subhl_stack):
+                    if gtk_ed.stacks.set(current_line, subhl_stack) and sync:
                         endi = gtk_ed.get_iter_at_line(current_line)
                         endi.backward_char()
                         endo = endi.get_offset()
@@ -526,8 +963,7 @@ class Highlighter(object):
         # of the buffer (didn't meet a stop pattern, or is the top level hl).
         #  In this case, we want to set the stack correctly for the remaining
         #  lines
-        for l in range(current_line + 1, end.get_line() + 1):
-            gtk_ed.stacks.set(l, subhl_stack)
+        gtk_ed.stacks.set_range(current_line + 1, end.get_line(), subhl_stack)
 
         results.append((None, end_offset, end_offset))
         return results
@@ -542,11 +978,19 @@ class Highlighter(object):
         end_it = gtk_ed.get_start_iter()
 
         if start_line == -1:
-            for tag, start, end in self.highlight_info_gen(gtk_ed, 0):
+            actions_list = self.highlight_info_gen(gtk_ed, 0, sync=False)
+            for tag, start, end in actions_list:
                 if tag:
                     start_it.set_offset(start)
                     end_it.set_offset(end)
                     gtk_ed.apply_tag(tag, start_it, end_it)
+
+            if gtk_ed.cache_ranges is not None:
+                self.record_tag_ranges(gtk_ed,
+                                       self.tag_ranges(actions_list, 0))
+        elif self.incremental:
+            self.highlight_damaged(gtk_ed, start_line,
+                                   max(nb_lines, self.nb_lines))
         else:
             st_iter = gtk_ed.get_iter_at_line(start_line)
             actions_list = self.highlight_info_gen(gtk_ed, start_line,
@@ -568,8 +1012,107 @@ class Highlighter(object):
 
         # print time() - t
 
-    def gtk_highlight(self, gtk_ed):
-        self.highlight_gen(gtk_ed, -1, -1)
+    def gtk_highlight(self, gtk_ed, visible=None):
+        """
+        Highlight the whole buffer. In lazy mode, if visible is given, only
+        these lines and a margin around them are highlighted right away, and
+        the rest of the buffer is highlighted in the background.
+
+        :type gtk_ed: Gtk.TextBuffer
+        :param (int, int) visible: The range of visible lines
+        """
+        self.cancel_idle_highlight(gtk_ed)
+        line_count = gtk_ed.get_line_count()
+
+        if visible is not None and cache.is_enabled(line_count):
+            gtk_ed.cache_key = cache.key(
+                self.spec_hash(),
+                gtk_ed.get_text(gtk_ed.get_start_iter(),
+                                gtk_ed.get_end_iter(), True))
+            if self.restore_from_cache(gtk_ed):
+                gtk_ed.cache_key = None
+                return
+            gtk_ed.cache_ranges = {}
+
+        if (not self.lazy or visible is None
+                or line_count <= visible[1] + self.nb_lines):
+            self.highlight_gen(gtk_ed, -1, -1)
+            self.save_to_cache(gtk_ed)
+            return
+
+        # Until the background highlighting reaches them, assume that lines
+        # do not start inside a region.
+        gtk_ed.stacks.set(0, [self.root_highlighter])
+        gtk_ed.stacks.set_range(1, line_count - 1, [self.root_highlighter])
+
+        first_line = max(0, visible[0] - self.nb_lines)
+        end_line = visible[1] + self.nb_lines
+        start_offset = gtk_ed.get_iter_at_line(first_line).get_offset()
+        self.apply_changed_tags(
+            gtk_ed, start_offset,
+            self.highlight_info_gen(gtk_ed, first_line, end_line, sync=False))
+
+        gtk_ed.next_highlight_line = 0
+        self.schedule_idle_highlight(gtk_ed)
+
+    def schedule_idle_highlight(self, gtk_ed):
+        """
+        (Re)schedule the background highlighting of gtk_ed, starting from
+        gtk_ed.next_highlight_line.
+
+        :type gtk_ed: Gtk.TextBuffer
+        """
+        if gtk_ed.idle_highlight_id:
+            GLib.source_remove(gtk_ed.idle_highlight_id)
+
+        gtk_ed.idle_highlight_id = GLib.idle_add(
+            self.idle_highlight, gtk_ed, priority=GLib.PRIORITY_LOW)
+        idle_highlighted[id(gtk_ed)] = (self, gtk_ed)
+
+    def cancel_idle_highlight(self, gtk_ed):
+        """
+        Cancel the background highlighting of gtk_ed, if any
+
+        :type gtk_ed: Gtk.TextBuffer
+        """
+        if gtk_ed.idle_highlight_id:
+            GLib.source_remove(gtk_ed.idle_highlight_id)
+        idle_highlighted.pop(id(gtk_ed), None)
+        gtk_ed.idle_highlight_id = None
+        gtk_ed.next_highlight_line = None
+        gtk_ed.cache_ranges = None
+        gtk_ed.cache_key = None
+
+    def idle_highlight(self, gtk_ed):
+        """
+        Highlight gtk_ed by chunks of nb_lines, starting from
+        gtk_ed.next_highlight_line, until the time budget is exhausted.
+        Returns whether more work remains.
+
+        :type gtk_ed: Gtk.TextBuffer
+        :rtype: bool
+        """
+        deadline = time.time() + self.idle_time_budget / 1000.0
+        line_count = gtk_ed.get_line_count()
+
+        while gtk_ed.next_highlight_line < line_count:
+            start_line = gtk_ed.next_highlight_line
+            end_line = start_line + self.nb_lines
+            start_offset = gtk_ed.get_iter_at_line(start_line).get_offset()
+            self.record_tag_ranges(gtk_ed, self.apply_changed_tags(
+                gtk_ed, start_offset,
+                self.highlight_info_gen(gtk_ed, start_line, end_line,
+                                        sync=False)))
+            gtk_ed.next_highlight_line = end_line
+
+            if time.time() >= deadline:
+                return True
+
+        idle_highlighted.pop(id(gtk_ed), None)
+        gtk_ed.idle_highlight_id = None
+        gtk_ed.next_highlight_line = None
+        self.save_to_cache(gtk_ed)
+        return False
 
     def gtk_highlight_region(self, gtk_ed, start_line, nb_lines):
         self.highlight_gen(gtk_ed, start_line, nb_lines)
@@ -578,18 +1121,28 @@ class Highlighter(object):
         gtk_ed = get_gtk_buffer(ed)
         gtk_ed.highlighting_initialized = True
         gtk_ed.stacks = HighlighterStacks()
+        gtk_ed.gps_file = ed.file()
 
         if not hasattr(gtk_ed, "idle_highlight_id"):
             gtk_ed.idle_highlight_id = None
+        gtk_ed.next_highlight_line = None
+        gtk_ed.cache_ranges = None
+        gtk_ed.cache_key = None
 
         def action_handler(loc, nb_lines):
             """:type loc: Gtk.TextIter"""
-            if gtk_ed.idle_highlight_id:
-                GLib.source_remove(gtk_ed.idle_highlight_id)
+            # The contents no longer match the key of the cache entry that
+            # was being built.
+            gtk_ed.cache_ranges = None
 
             # Highlight all the rest of the buffer
             self.gtk_highlight_region(gtk_ed, loc.get_line(), nb_lines)
 
+            # The modification has been taken into account, postpone the
+            # background highlighting after it.
+            if gtk_ed.idle_highlight_id:
+                self.schedule_idle_highlight(gtk_ed)
+
         # noinspection PyUnusedLocal
         def highlighting_insert_text_before(buf, loc, text, length):
             buf.insert_loc = loc.to_tuple()
@@ -599,6 +1152,9 @@ class Highlighter(object):
             nb_new_lines = len(text.split("\n")) - 1
             itr = buf.iter_from_tuple(buf.insert_loc)
             buf.stacks.insert_newlines(nb_new_lines, itr.get_line())
+            if (buf.next_highlight_line is not None
+                    and buf.next_highlight_line > itr.get_line()):
+                buf.next_highlight_line += nb_new_lines
             action_handler(itr, nb_new_lines + 1)
 
         def highlighting_delete_range_before(buf, loc, end):
@@ -609,6 +1165,11 @@ class Highlighter(object):
         # noinspection PyUnusedLocal
         def highlighting_delete_range(buf, loc, end):
             buf.stacks.delete_lines(buf.nb_deleted_lines, loc.get_line())
+            if (buf.next_highlight_line is not None
+                    and buf.next_highlight_line > loc.get_line()):
+                buf.next_highlight_line = max(
+                    loc.get_line() + 1,
+                    buf.next_highlight_line - buf.nb_deleted_lines)
             # Recompute the highlighting of the 100 next lines
             action_handler(loc, self.nb_lines)
 
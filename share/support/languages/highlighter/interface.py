@@ -373,7 +373,7 @@ def existing_style(pref_name, name="", prio=-1):
         pass  # TODO: remove this exception handler, used for doc framework
 
 
-def register_highlighter(language, spec, igncase=False):
+def register_highlighter(language, spec, igncase=False, incremental=True):
     """
     Used to register the declaration of an highlighter. See the tutorial for
     more information
@@ -381,6 +381,10 @@ def register_highlighter(language, spec, igncase=False):
     :param string language: The language to be used as a filter for the
        highlighter.
     :param tuple spec: The spec of the highlighter.
+    :param bool incremental: Whether modifications to the buffer should only
+       update the tags that changed, instead of rehighlighting a fixed
+       number of lines after the modification.
     """
     from highlighter.engine import Highlighter, HighlighterModule
-    HighlighterModule.highlighters[language] = Highlighter(spec, igncase)
+    HighlighterModule.highlighters[language] = Highlighter(
+        spec, igncase, incremental=incremental)
@@ -166,13 +166,15 @@ class Profile:
     the result in the log.
     """
 
-    def __init__(self, time_only=False):
+    def __init__(self, time_only=False, name=''):
         """
         :param bool time_only: if true, only display the time it topok to
            execute, not the whole profile
+        :param str name: what is being timed, for the log
         """
         import cProfile
         self.time_only = time_only
+        self.name = name
         if time_only:
             self.start = time.time()
         else:
@@ -186,7 +188,9 @@ class Profile:
     def __exit__(self, exc_type=None, exc_val=None, exc_tb=None):
         if self.time_only:
             GPS.Logger("VCS2").log(
-                "Total time: %ss" % (time.time() - self.start, ))
+                "Total time%s: %ss" % (
+                    " for %s" % self.name if self.name else "",
+                    time.time() - self.start))
         else:
             import pstats
             import StringIO
@@ -250,6 +254,10 @@ class VCS(GPS.VCS2):
         self.default_status = default_status
         self._extensions = []   # the decorators that apply to self
 
+        self._status_snapshot = {}
+        # The last status emitted for each file by set_status_for_all_files,
+        # indexed by absolute path: (status, version, repo_version)
+
         # Check which decorators apply
         for d in self._class_extensions:
             inst = d(base_vcs=self)
@@ -499,17 +507,24 @@ class VCS(GPS.VCS2):
         some data across session. This function takes into account this saved
         data and modifies the status as needed.
 
+        Only the statuses that changed since the previous call are sent
+        to GPS, grouped by status. Files can be given by their path (either
+        absolute or relative to the working directory) rather than as
+        GPS.File, which avoids creating a GPS.File for files whose status
+        did not change.
+
         :param Set(GPS.File): the set of files to update. This parameter is
            only used when using this function as a context manager (the 'with'
            statement in python).
         """
 
         vcs = self
+        root = self.working_dir.path
 
         class _CM(object):
             def __init__(self):
-                self._seen = set()
-                self._cache = {}    # (status,version,repo_version) -> [File]
+                # path -> (GPS.File or None, (status,version,repo_version))
+                self._statuses = {}
 
             def __enter__(self):
                 return self
@@ -519,7 +534,8 @@ class VCS(GPS.VCS2):
                 """
                 Return the set of files for which an explicit status was set
                 """
-                return self._seen
+                return set(f or GPS.File(path)
+                           for path, (f, _) in self._statuses.iteritems())
 
             def set_status(
                     self, file,
@@ -528,15 +544,18 @@ class VCS(GPS.VCS2):
                     repo_version=""):
                 """
                 Set the status for one file
-                :param GPS.File file:
+                :param GPS.File|str file: the file, or its path
                 :param GPS.VCS2.Status status:
                 :param GPS.VCS2.Attributes attributes:
                 :param str version:
                 :param str repo_version:
                 """
-                self._seen.add(file)
-                self._cache.setdefault(
-                    (status, version, repo_version), []).append(file)
+                if isinstance(file, basestring):
+                    path = os.path.join(root, file)
+                    file = None
+                else:
+                    path = file.path
+                self._statuses[path] = (file, (status, version, repo_version))
 
             def set_status_for_remaining_files(self, files=set()):
                 """
@@ -545,17 +564,31 @@ class VCS(GPS.VCS2):
 
                 :param set(GPS.File)|list(GPS.File) files:
                 """
-                GPS.Logger("VCS2").log("Emit file statuses")
-                for s, s_files in self._cache.iteritems():
-                    vcs._set_file_status(s_files, s[0], s[1], s[2])
-                GPS.Logger("VCS2").log("Done emit file statuses")
-
-                to_set = []
-                for f in files:
-                    if f not in self._seen:
-                        to_set.append(f)
-                vcs._set_file_status(to_set, vcs.default_status)
-                GPS.Logger("VCS2").log("Done emit default statuses")
+                snapshot = vcs._status_snapshot
+                with Profile(time_only=True, name="emitting statuses"):
+                    changed = {}   # (status,version,repo_version) -> [File]
+                    for path, (f, props) in self._statuses.iteritems():
+                        if snapshot.get(path) != props:
+                            snapshot[path] = props
+                            changed.setdefault(props, []).append(
+                                f or GPS.File(path))
+
+                    default = (vcs.default_status, "", "")
+                    count = len(self._statuses)
+                    for f in files:
+                        count += 1
+                        path = f.path
+                        if (path not in self._statuses and
+                                snapshot.get(path) != default):
+                            snapshot[path] = default
+                            changed.setdefault(default, []).append(f)
+
+                    GPS.Logger("VCS2").log(
+                        "Emit file statuses: %s changed out of %s" % (
+                            sum(len(c) for c in changed.itervalues()),
+                            count))
+                    for props, s_files in changed.iteritems():
+                        vcs._set_file_status(s_files, *props)
 
             def __exit__(self, exc_type=None, exc_val=None, exc_tb=None):
                 self.set_status_for_remaining_files(files)
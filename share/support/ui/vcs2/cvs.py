@@ -161,7 +161,11 @@ class CVS(core_staging.Emulate_Staging,
                     out_stream.emit(self.previous)
                     self.previous = None
 
-            def __call__(self, out_stream, line):
+            def __call__(self, out_stream, lines):
+                for line in lines:
+                    self.online(out_stream, line)
+
+            def online(self, out_stream, line):
 
                 if line.startswith(FILE_HEADER):
                     self.file = line[len(FILE_HEADER):]
@@ -214,7 +218,7 @@ class CVS(core_staging.Emulate_Staging,
                 self.emit_previous(out_stream)
 
         p = self._cvs(['log', '-N'] + args)
-        return p.lines.flatMap(line_to_block())
+        return p.stream_batches().flatMap(line_to_block())
 
     @core.run_in_background
     def async_fetch_history(self, visitor, filter):
@@ -1,7 +1,9 @@
 import GPS
 from . import core
+import hashlib
 import os
 import re
+import weakref
 import workflows
 from workflows.promises import ProcessWrapper, join, Promise
 import datetime
@@ -22,6 +24,93 @@ LOCAL_CHANGES_ID = 'Local change'
 _version = None
 # Git version
 
+HISTORY_CACHE_SIZE = 10
+# Maximum number of filters for which the history is cached
+
+STATUS_PATHSPECS_LIMIT = 200
+# When more paths than this might have changed since the last "git status",
+# the status of the whole working directory is recomputed
+
+_CONFLICTS = ('DD', 'AU', 'UD', 'UA', 'DU', 'AA', 'UU')
+# The "XY" codes of "git status --porcelain" that indicate a conflict
+
+_IGNORED_EXTENSIONS = ('.o', '.ali')
+# Untracked or ignored files with these extensions are not reported, to
+# speed things up
+
+_instances = weakref.WeakSet()
+# All instances of Git, to monitor the files they contain
+
+
+class _History_Cache(object):
+    """
+    The output of "git log" already fetched for one set of filters in
+    the History view.
+    """
+
+    def __init__(self):
+        self.lines = []
+        # The lines output by "git log", in order
+
+        self.complete = False
+        # Whether all the history was fetched
+
+
+def _status_from_xy(x, y):
+    """
+    Convert the "XY" code output by "git status --porcelain" to a status.
+
+    :param str x: the status of the file in the index
+    :param str y: the status of the file in the working tree
+    :returntype: GPS.VCS2.Status
+    """
+    if x + y in _CONFLICTS:
+        return GPS.VCS2.Status.CONFLICT
+
+    status = 0
+
+    if x == 'M':
+        status = GPS.VCS2.Status.STAGED_MODIFIED
+    elif x == 'A':
+        status = GPS.VCS2.Status.STAGED_ADDED
+    elif x == 'D':
+        status = GPS.VCS2.Status.STAGED_DELETED
+    elif x == 'R':
+        status = GPS.VCS2.Status.STAGED_RENAMED
+    elif x == 'C':
+        status = GPS.VCS2.Status.STAGED_COPIED
+    elif x == '?':
+        status = GPS.VCS2.Status.UNTRACKED
+    elif x == '!':
+        status = GPS.VCS2.Status.IGNORED
+
+    if y == 'M':
+        status = status | GPS.VCS2.Status.MODIFIED
+    elif y == 'D':
+        status = status | GPS.VCS2.Status.DELETED
+
+    return status
+
+
+def _on_file_changed(hook, file, file2=None):
+    for vcs in _instances:
+        vcs._file_changed(file)
+        if file2 is not None:
+            vcs._file_changed(file2)
+
+
+def _on_external_change(hook):
+    for vcs in _instances:
+        vcs._full_status_needed = True
+        vcs._local_changes = None
+
+
+GPS.Hook('file_saved').add(_on_file_changed)
+GPS.Hook('file_changed_on_disk').add(_on_file_changed)
+GPS.Hook('file_deleted').add(_on_file_changed)
+GPS.Hook('file_renamed').add(_on_file_changed)
+GPS.Hook('after_file_changed_detected').add(_on_external_change)
+
 
 @core.register_vcs(default_status=GPS.VCS2.Status.NO_VCS)
 class Git(core.VCS):
@@ -34,9 +123,50 @@ class Git(core.VCS):
     def __init__(self, *args, **kwargs):
         super(Git, self).__init__(*args, **kwargs)
 
-        self._non_default_files = None
-        # Files with a non-default status
+        self._statuses = None
+        # The result of the last "git status": the GPS.VCS2.Status of each
+        # path relative to the working directory. None if it has not run
+        # yet.
+
+        self._full_status_needed = True
+        # Whether any file might have changed in ways we do not know about,
+        # so that "git status" must run on the whole working directory
+
+        self.__changed = set()
+        # The paths, relative to the working directory, that have changed
+        # since the last "git status"
+
+        self.__dir_mtimes = {}
+        # The modification time of the directories containing files, when
+        # "git status" last ran. A directory is modified when files are
+        # added or removed.
+
+        self.__index_mtime = None
+        # The modification time of the index when "git status" last ran
+
+        self.__tree = None
+        # The id of the tree of HEAD when __tracked was computed
+
+        self.__tracked = []
+        # The paths of the files under version control in HEAD, relative to
+        # the working directory
+
+        self._local_changes = None
+        # Whether the last "git status" reported uncommitted changes to
+        # files under version control, None if it has not run yet or if
+        # files have changed since then
+
+        self.__history_tips = None
+        # The tips of all refs when __history and __unpushed were computed
+
+        self.__history = {}
+        # The history already fetched, for each filter. See _History_Cache
+
+        self.__unpushed = None
+        # The result of _unpushed_local_changes, None if not computed yet
+
         self.__set_git_version()
+        _instances.add(self)
 
     def _git(self, args, block_exit=False, **kwargs):
         """
@@ -52,63 +182,175 @@ class Git(core.VCS):
             directory=self.working_dir.path,
             **kwargs)
 
-    def __git_ls_tree(self, all_files):
+    def _file_changed(self, file):
+        """
+        Called when file (or a directory) was changed by GPS, so that the
+        next "git status" takes it into account.
+
+        :param GPS.File file:
+        """
+        path = file.path.rstrip(os.sep)
+        root = self.working_dir.path.rstrip(os.sep)
+        if path == root:
+            self._full_status_needed = True
+            self._local_changes = None
+        elif path.startswith(root + os.sep):
+            self.__changed.add(self._relpath(path))
+            self._local_changes = None
+
+    def __index_changed(self, files):
+        """
+        Called after we modified the index for some files, so that the next
+        "git status" only needs to look at them.
+
+        :param List(GPS.File) files:
+        """
+        for f in files:
+            self._file_changed(f)
+        self.__index_mtime = self.__mtime(self.__index_file())
+
+    def __index_file(self):
+        """
+        Return the location of the index file
+        :returntype: str
+        """
+        git_dir = os.path.join(self.working_dir.path, '.git')
+        if os.path.isfile(git_dir):
+            # With "git worktree", ".git" is a file "gitdir: <path>"
+            try:
+                with open(git_dir) as f:
+                    git_dir = os.path.join(
+                        self.working_dir.path, f.read()[8:].strip())
+            except IOError:
+                pass
+        return os.path.join(git_dir, 'index')
+
+    def __mtime(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def __changed_paths(self):
+        """
+        Compute the paths whose status might have changed since the last
+        "git status".
+
+        :returntype: a list of paths relative to the working directory, or
+           None if the status of the whole working directory is needed.
+        """
+        if (self._full_status_needed
+                or self._statuses is None
+                or self.__mtime(self.__index_file()) != self.__index_mtime):
+            return None
+
+        changed = set(self.__changed)
+        root = self.working_dir.path
+        for d, mtime in self.__dir_mtimes.iteritems():
+            if self.__mtime(os.path.join(root, d)) != mtime:
+                if not d:
+                    return None   # would be the whole working directory
+                changed.add(d)
+
+            if len(changed) > STATUS_PATHSPECS_LIMIT:
+                return None
+
+        return list(changed)
+
+    def __record_mtimes(self):
+        """
+        Save the modification times of the index and of all directories
+        containing files, after running "git status".
+        """
+        self.__index_mtime = self.__mtime(self.__index_file())
+
+        dirs = set(os.path.dirname(path) for path in self.__tracked)
+        dirs.update(os.path.dirname(path.rstrip('/'))
+                    for path in self._statuses)
+
+        root = self.working_dir.path
+        self.__dir_mtimes = {
+            d: self.__mtime(os.path.join(root, d)) for d in dirs}
+
+    def __head_tree(self):
+        """
+        Return the id of the tree of HEAD, None if there is no commit yet
+        """
+        p = self._git(['rev-parse', 'HEAD^{tree}'])
+        status, output = yield p.wait_until_terminate()
+        yield output.strip() if status == 0 else None
+
+    def __git_ls_tree(self, tracked):
         """
         Compute all files under version control
-        :param list all_files: will be modified to include the list of files
+        :param list tracked: will be modified to include the list of files,
+           relative to the working directory
         """
-        def on_line(line):
-            all_files.append(
-                GPS.File(os.path.join(self.working_dir.path, line)))
-        p = self._git(['ls-tree', '-r', 'HEAD', '--name-only'])
-        yield p.lines.subscribe(on_line)   # wait until p terminates
+        p = self._git(['ls-tree', '-r', '-z', 'HEAD', '--name-only'])
+        _, output = yield p.wait_until_terminate()
+        tracked.extend(path for path in output.split('\0') if path)
 
-    def __git_status(self, s):
+    def __git_status(self, statuses, paths=None):
         """
         Run and parse "git status"
-        :param s: the result of calling self.set_status_for_all_files
+        :param dict statuses: filled with the status of files, see
+           self._statuses
+        :param List(str) paths: only compute the status of these paths,
+           relative to the working directory. All files if None.
         """
-        def on_line(line):
-            if len(line) > 3:
-                if line[0:2] in ('DD', 'AU', 'UD', 'UA', 'DU', 'AA', 'UU'):
-                    status = GPS.VCS2.Status.CONFLICT
-                else:
-                    status = 0
-
-                    if line[0] == 'M':
-                        status = GPS.VCS2.Status.STAGED_MODIFIED
-                    elif line[0] == 'A':
-                        status = GPS.VCS2.Status.STAGED_ADDED
-                    elif line[0] == 'D':
-                        status = GPS.VCS2.Status.STAGED_DELETED
-                    elif line[0] == 'R':
-                        status = GPS.VCS2.Status.STAGED_RENAMED
-                    elif line[0] == 'C':
-                        status = GPS.VCS2.Status.STAGED_COPIED
-                    elif line[0] == '?':
-                        status = GPS.VCS2.Status.UNTRACKED
-                    elif line[0] == '!':
-                        status = GPS.VCS2.Status.IGNORED
-
-                    if line[1] == 'M':
-                        status = status | GPS.VCS2.Status.MODIFIED
-                    elif line[1] == 'D':
-                        status = status | GPS.VCS2.Status.DELETED
-
-                # Filter some obvious files to speed things up
-                if line[-3:] != '.o' and line[-5:] != '.ali':
-                    s.set_status(
-                        GPS.File(
-                            os.path.join(self.working_dir.path, line[3:])),
-                        status)
+        not_versioned = GPS.VCS2.Status.UNTRACKED | GPS.VCS2.Status.IGNORED
+
+        def add(path, status):
+            # Filter some obvious files to speed things up
+            if (not status & not_versioned
+                    or not path.endswith(_IGNORED_EXTENSIONS)):
+                statuses[path] = status
 
         if _version < [1, 7, 2]:
             ignored = []
         else:
             ignored = ['--ignored']
 
-        p = self._git(['status', '--porcelain'] + ignored)
-        yield p.lines.subscribe(on_line)   # wait until p terminates
+        # The untracked cache lets git skip the directories that have not
+        # changed since the last run when looking for untracked files.
+        cmd = ['-c', 'core.untrackedCache=true', 'status']
+
+        # The paths are file names, not patterns
+        if paths and _version >= [1, 8, 1]:
+            cmd.insert(0, '--literal-pathspecs')
+
+        if _version >= [2, 11, 0]:
+            # Faster to parse: no quoting of file names, and renames use
+            # a separate entry.
+            p = self._git(cmd + ['--porcelain=v2', '-z'] + ignored +
+                          ['--'] + (paths or []))
+            _, output = yield p.wait_until_terminate()
+
+            entries = output.split('\0')
+            renamed = False
+            for e in entries:
+                if renamed:
+                    renamed = False    # the original path of a rename
+                elif e.startswith('1 '):
+                    add(e.split(' ', 8)[8], _status_from_xy(e[2], e[3]))
+                elif e.startswith('2 '):
+                    add(e.split(' ', 9)[9], _status_from_xy(e[2], e[3]))
+                    renamed = True
+                elif e.startswith('u '):
+                    add(e.split(' ', 10)[10], GPS.VCS2.Status.CONFLICT)
+                elif e.startswith('? '):
+                    add(e[2:], GPS.VCS2.Status.UNTRACKED)
+                elif e.startswith('! '):
+                    add(e[2:], GPS.VCS2.Status.IGNORED)
+
+        else:
+            def on_line(line):
+                if len(line) > 3:
+                    add(line[3:], _status_from_xy(line[0], line[1]))
+
+            p = self._git(cmd + ['--porcelain'] + ignored +
+                          ['--'] + (paths or []))
+            yield p.lines.subscribe(on_line)   # wait until p terminates
 
     @workflows.run_as_workflow
     def __set_git_version(self):
@@ -140,31 +382,74 @@ class Git(core.VCS):
 
         s = self.set_status_for_all_files()
 
-        # Do we need to reset the "ls-tree" cache ? After the initial
-        # loading, this list no longer changes without also impacting the
-        # output of "git status", so we do not need to execute it again.
-        if from_user or self._non_default_files is None:
-            all_files = []   # faster to update than a set
-            yield join(self.__git_ls_tree(all_files), self.__git_status(s))
-            self._non_default_files = s.files_with_explicit_status
-            now_default = set(all_files).difference(self._non_default_files)
+        for f in extra_files:
+            self._file_changed(f)
+
+        # The list of files under version control only changes with HEAD.
+        # Otherwise, the output of "git status" reports the changes.
+        tree = yield self.__head_tree()
+        tree_changed = tree is None or tree != self.__tree
+        tracked = []
+
+        # Only run "git status" for the files that might have changed
+        # since the last run, when we know them. Files modified outside of
+        # GPS are not detected, so an explicit refresh by the user always
+        # checks the whole working directory.
+        if tree_changed or from_user:
+            paths = None
         else:
-            # Reuse caches: we do not need to recompute the full list of files
-            # for git, since this will not change without also changing the
-            # output of "git status". We also do not reset the default status
-            # for all the files not in the git status output: that might be a
-            # slow operation that is blocking GPS. Instead, we only reset the
-            # default status for files that used to be in "git status" (for
-            # instance modified files), and are no longer there (either after
-            # a "reset" or a "commit").
-
-            yield self.__git_status(s)
-            nondefault = s.files_with_explicit_status
-            now_default = self._non_default_files.difference(nondefault)
-            self._non_default_files = nondefault
-
-        for f in now_default:
-            s.set_status(f, GPS.VCS2.Status.UNMODIFIED)
+            paths = self.__changed_paths()
+        self.__changed = set()
+        self._full_status_needed = False
+
+        if paths is None:
+            GPS.Logger("GIT").log("git status on the whole working dir")
+            statuses = {}
+            if tree_changed:
+                yield join(self.__git_ls_tree(tracked),
+                           self.__git_status(statuses))
+                self.__tree = tree
+                self.__tracked = tracked
+            else:
+                yield self.__git_status(statuses)
+
+        else:
+            GPS.Logger("GIT").log("git status on %s paths" % (len(paths), ))
+            statuses = dict(self._statuses)
+            if paths:
+                prefixes = tuple(p + '/' for p in paths)
+                for path in paths:
+                    statuses.pop(path, None)
+                for path in [f for f in statuses if f.startswith(prefixes)]:
+                    del statuses[path]
+                yield self.__git_status(statuses, paths)
+
+        # Files that used to have an explicit status (for instance modified
+        # files) and are no longer in the output of "git status" (either
+        # after a "reset" or a "commit") are now unmodified. When the user
+        # refreshes, or the list of files has changed, reset the status of
+        # all files instead.
+
+        if from_user or tree_changed or self._statuses is None:
+            now_default = [path for path in self.__tracked
+                           if path not in statuses]
+        else:
+            now_default = [path for path in self._statuses
+                           if path not in statuses]
+
+        self._statuses = statuses
+        self.__record_mtimes()
+
+        local = ~(GPS.VCS2.Status.UNTRACKED | GPS.VCS2.Status.IGNORED)
+        self._local_changes = any(
+            status & local for status in statuses.itervalues())
+
+        # Only the statuses that changed are sent to GPS, so pass paths
+        # rather than GPS.File.
+        for path, status in statuses.iteritems():
+            s.set_status(path, status)
+        for path in now_default:
+            s.set_status(path, GPS.VCS2.Status.UNMODIFIED)
 
         s.set_status_for_remaining_files()
 
@@ -173,6 +458,7 @@ class Git(core.VCS):
         p = self._git(['add' if stage else 'reset'] + [f.path for f in files],
                       block_exit=True)
         yield p.wait_until_terminate(show_if_error=True)
+        self.__index_changed(files)
         yield self.async_fetch_status_for_all_files(from_user=False)
 
     @core.run_in_background
@@ -252,18 +538,49 @@ class Git(core.VCS):
         """
         Check whether there is any uncomitted change.
         """
-        p = self._git(['diff', '--quiet', 'HEAD', '--'])
-        status, _ = yield p.wait_until_terminate()
-        yield status != 0
+        if self._local_changes is not None:
+            # Already known from the last "git status"
+            yield self._local_changes
+        else:
+            p = self._git(['diff', '--quiet', 'HEAD', '--'])
+            status, _ = yield p.wait_until_terminate()
+            yield status != 0
+
+    def _ref_tips(self):
+        """
+        Compute a signature of the tips of HEAD and of all refs, which
+        changes whenever new commits are visible in the history.
+
+        :returntype: str
+        """
+        p = self._git(['show-ref', '--head'])
+        _, output = yield p.wait_until_terminate()
+        yield hashlib.sha1(output).hexdigest()
+
+    def _cached_unpushed_local_changes(self):
+        """
+        Same as `_unpushed_local_changes`, but only runs "git cherry" when
+        the refs have changed since the last call.
+        Must be called after `self.__history_tips` has been updated.
+        """
+        if self.__unpushed is None:
+            self.__unpushed = yield self._unpushed_local_changes()
+        yield self.__unpushed
 
     @core.run_in_background
     def async_fetch_history(self, visitor, filter):
         # Compute, in parallel, needed pieces of information
-        (unpushed, has_local) = yield join(
-            self._unpushed_local_changes(),
-            self._has_local_changes())
+        (tips, has_local) = yield join(
+            self._ref_tips(), self._has_local_changes())
+
+        # The history we fetched before is still valid as long as no ref
+        # has moved.
+        if tips != self.__history_tips:
+            self.__history_tips = tips
+            self.__history = {}
+            self.__unpushed = None
 
-        # Then fetch the history
+        unpushed = yield self._cached_unpushed_local_changes()
 
         max_lines = filter[0]
         for_file = filter[1]
@@ -271,6 +588,32 @@ class Git(core.VCS):
         current_branch_only = filter[3]
         branch_commits_only = filter[4]
 
+        key = (for_file.path if for_file else None,
+               pattern, current_branch_only, branch_commits_only)
+        cache = self.__history.get(key)
+        if cache is None:
+            if len(self.__history) >= HISTORY_CACHE_SIZE:
+                self.__history = {}
+            cache = self.__history[key] = _History_Cache()
+
+        # First report the lines we already know about, then only fetch
+        # the next page of the history, if needed
+
+        if branch_commits_only:
+            known = cache.lines
+        else:
+            known = cache.lines[:max_lines]
+
+        for line in known:
+            self.__add_history_line(visitor, line, unpushed, has_local)
+
+        nb_added_lines = len(known)
+        if cache.complete or (
+                not branch_commits_only and nb_added_lines >= max_lines):
+            GPS.Logger("GIT").log(
+                "reused cached git-log (%s lines)" % (nb_added_lines, ))
+            return
+
         filter_switch = ''
         if pattern:
             if pattern.startswith('author:'):
@@ -293,64 +636,85 @@ class Git(core.VCS):
         git_cmd += [
             '--topo-order',  # children before parents
             filter_switch,
-            '--max-count=%d' % max_lines if not branch_commits_only else '',
+            '--skip=%d' % nb_added_lines if nb_added_lines else '',
+            '--max-count=%d' % (max_lines - nb_added_lines)
+            if not branch_commits_only else '',
             '%s' % for_file.path if for_file else '']
         p = self._git(git_cmd)
 
-        nb_added_lines = 0
+        done = False
 
-        while True:
-            line = yield p.wait_line()
-            if line is None or '@@' not in line:
-                GPS.Logger("GIT").log("finished git-status")
+        while not done:
+            lines = yield p.wait_lines()
+            if lines is None:
                 break
 
-            id, parents, author, branches, date, subject = line.split('@@')
-            parents = parents.split()
-            branches = None if not branches else branches.split(',')
+            for line in lines:
+                if '@@' not in line:
+                    done = True
+                    break
+                self.__add_history_line(visitor, line, unpushed, has_local)
 
-            flags = 0
-            if id in unpushed:
-                flags |= GPS.VCS2.Commit.Flags.UNPUSHED
+                # Another fetch might have updated the cache meanwhile
+                if len(cache.lines) == nb_added_lines:
+                    cache.lines.append(line)
+                nb_added_lines += 1
 
-            if branches is None:
-                branch_descr = None
-            else:
-                branch_descr = []
-                for b in branches:
-                    b = b.strip()
-
-                    # ??? How do we detect other remotes
-                    if b.startswith('origin/'):
-                        f = (b, GPS.VCS2.Commit.Kind.REMOTE)
-                    elif b.startswith("HEAD"):
-                        f = (b, GPS.VCS2.Commit.Kind.HEAD)
-                        # Append a dummy entry if we have local changes, and
-                        # we have the HEAD
-                        if has_local:
-                            visitor.history_line(GPS.VCS2.Commit(
-                                LOCAL_CHANGES_ID,
-                                '',
-                                '',
-                                '<uncommitted changes>',
-                                parents=[id],
-                                flags=GPS.VCS2.Commit.Flags.UNCOMMITTED |
-                                GPS.VCS2.Commit.Flags.UNPUSHED))
-
-                    elif b.startswith("tag: "):
-                        f = (b[5:], GPS.VCS2.Commit.Kind.TAG)
-                    else:
-                        f = (b, GPS.VCS2.Commit.Kind.LOCAL)
-
-                    branch_descr.append(f)
-
-            visitor.history_line(GPS.VCS2.Commit(
-                id, author, date, subject, parents, branch_descr, flags=flags))
-            nb_added_lines += 1
+        if len(cache.lines) == nb_added_lines and (
+                done or branch_commits_only or nb_added_lines < max_lines):
+            cache.complete = True
 
+        GPS.Logger("GIT").log("finished git-status")
         GPS.Logger("GIT").log(
             "done parsing git-log (%s lines)" % (nb_added_lines, ))
 
+    def __add_history_line(self, visitor, line, unpushed, has_local):
+        """
+        Parse one line of the output of "git log" in async_fetch_history,
+        and report it to the visitor.
+        """
+        id, parents, author, branches, date, subject = line.split('@@')
+        parents = parents.split()
+        branches = None if not branches else branches.split(',')
+
+        flags = 0
+        if id in unpushed:
+            flags |= GPS.VCS2.Commit.Flags.UNPUSHED
+
+        if branches is None:
+            branch_descr = None
+        else:
+            branch_descr = []
+            for b in branches:
+                b = b.strip()
+
+                # ??? How do we detect other remotes
+                if b.startswith('origin/'):
+                    f = (b, GPS.VCS2.Commit.Kind.REMOTE)
+                elif b.startswith("HEAD"):
+                    f = (b, GPS.VCS2.Commit.Kind.HEAD)
+                    # Append a dummy entry if we have local changes, and
+                    # we have the HEAD
+                    if has_local:
+                        visitor.history_line(GPS.VCS2.Commit(
+                            LOCAL_CHANGES_ID,
+                            '',
+                            '',
+                            '<uncommitted changes>',
+                            parents=[id],
+                            flags=GPS.VCS2.Commit.Flags.UNCOMMITTED |
+                            GPS.VCS2.Commit.Flags.UNPUSHED))
+
+                elif b.startswith("tag: "):
+                    f = (b[5:], GPS.VCS2.Commit.Kind.TAG)
+                else:
+                    f = (b, GPS.VCS2.Commit.Kind.LOCAL)
+
+                branch_descr.append(f)
+
+        visitor.history_line(GPS.VCS2.Commit(
+            id, author, date, subject, parents, branch_descr, flags=flags))
+
     @core.run_in_background
     def async_fetch_commit_details(self, ids, visitor):
         if LOCAL_CHANGES_ID in ids:
@@ -799,6 +1163,7 @@ class Git(core.VCS):
         n = [f.path for f in files]
         yield self._git(['reset'] + n).wait_until_terminate()
         yield self._git(['checkout'] + n).wait_until_terminate()
+        self.__index_changed(files)
         GPS.MDI.information_popup(
             'Local changes discarded', 'github-commit-symbolic')
 
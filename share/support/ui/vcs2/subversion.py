@@ -138,7 +138,11 @@ class SVN(core_staging.Emulate_Staging,
                 # keep previous commit until we find id of next one
                 self.prev = None
 
-            def __call__(self, out_stream, line):
+            def __call__(self, out_stream, lines):
+                for line in lines:
+                    self.online(out_stream, line)
+
+            def online(self, out_stream, line):
                 if line.startswith('--------------------------------------'):
                     if self.current:
                         if self.prev:
@@ -166,7 +170,7 @@ class SVN(core_staging.Emulate_Staging,
                     out_stream.emit(self.prev)
 
         p = self._svn(['log', '--non-interactive'] + args)
-        return p.lines.flatMap(line_to_block())
+        return p.stream_batches().flatMap(line_to_block())
 
     @core.run_in_background
     def async_fetch_history(self, visitor, filter):
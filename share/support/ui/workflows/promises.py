@@ -456,6 +456,58 @@ def hook(hook_name):
     return p
 
 
+class _Line_Splitter(object):
+    """
+    Split the output of a process into lines, for ProcessWrapper.lines
+    and ProcessWrapper.stream_batches. This is meant to be used with
+    Stream.flatMap.
+    """
+
+    def __init__(self, batches=False):
+        """
+        :param bool batches: if True, emit the list of lines found in each
+           output chunk, rather than each line separately.
+        """
+        self.batches = batches
+
+        # The output received since the last newline
+        self.buffer = []
+
+    def __emit(self, out_stream, lines):
+        if self.batches:
+            out_stream.emit(lines)
+        else:
+            for line in lines:
+                out_stream.emit(line)
+
+    def __call__(self, out_stream, output):
+        self.buffer.append(output)
+        if "\n" not in output:
+            return
+
+        lines = "".join(self.buffer).split("\n")
+        self.buffer = [lines.pop()]
+        self.__emit(out_stream, lines)
+
+    def oncompleted(self, out_stream, status):
+        last = "".join(self.buffer)
+        if last:
+            self.__emit(out_stream, [last])
+
+
+class _Lines_Batch(object):
+    """
+    What ProcessWrapper.wait_lines is waiting for: up to max_lines lines,
+    or the lines received within max_ms milliseconds of the first one.
+    """
+
+    def __init__(self, max_lines, max_ms):
+        self.max_lines = max_lines
+        self.max_ms = max_ms
+        self.lines = []
+        self.timeout_id = None
+
+
 class ProcessWrapper(object):
     """
     ProcessWrapper is an advanced process manager
@@ -511,11 +563,25 @@ class ProcessWrapper(object):
         # the stream that includes all output from the process
         self.__stream = None
 
-        # __current_pattern = regexp that user waiting for in the output
+        # __current_pattern = regexp that user waiting for in the output,
+        # None when waiting for a line, or a _Lines_Batch when waiting for
+        # several lines
         self.__current_pattern = None
 
-        # __output = a buffer for current output of self.__process
+        # __output = a buffer for current output of self.__process. Only the
+        # part after __output_offset has not been consumed yet, and the
+        # output received since the last search is kept in __chunks until
+        # it is needed, so that accumulating the output is linear.
         self.__output = ""
+        self.__output_offset = 0
+        self.__chunks = []
+
+        # Whether one of __chunks contains a newline
+        self.__newline_in_chunks = False
+
+        # The offset in __output from which to search for the next newline:
+        # there is none between __output_offset and this offset.
+        self.__scanned = 0
 
         # __whether process has finished
         self.finished = False
@@ -605,13 +671,128 @@ class ProcessWrapper(object):
         Called by GPS everytime there's output coming
         """
         if self.__current_promise is not None:
-            self.__output += unmatch
-            self.__output += match
+            self.__append_output(unmatch)
+            self.__append_output(match)
             self.__check_pattern_and_resolve()
         if self.__stream is not None:
             self.__stream.emit(unmatch)
             self.__stream.emit(match)
 
+    def __append_output(self, output):
+        """
+        Add output at the end of the output not consumed yet.
+        """
+        if output:
+            self.__chunks.append(output)
+            if "\n" in output:
+                self.__newline_in_chunks = True
+
+    def __merge_output(self):
+        """
+        Merge the pending chunks in __output, and drop the part of __output
+        that has already been consumed.
+        """
+        if self.__output_offset or self.__chunks:
+            self.__chunks.insert(0, self.__output[self.__output_offset:])
+            self.__output = "".join(self.__chunks)
+            self.__scanned = max(0, self.__scanned - self.__output_offset)
+            self.__output_offset = 0
+            self.__chunks = []
+            self.__newline_in_chunks = False
+
+    def __consume_output(self, end):
+        """
+        Consume the output up to end, and return it.
+        """
+        result = self.__output[self.__output_offset:end]
+        self.__output_offset = end
+        self.__scanned = end
+        return result
+
+    def __search_line(self):
+        """
+        Search for the next complete line in the output not consumed yet,
+        without looking again at the output already searched. Returns the
+        offset of the newline that ends it in __output, or -1.
+        """
+        eol = self.__output.find("\n", self.__scanned)
+        if eol == -1:
+            self.__scanned = len(self.__output)
+            if self.__newline_in_chunks:
+                self.__merge_output()
+                eol = self.__output.find("\n", self.__scanned)
+        return eol
+
+    def __read_lines(self, batch):
+        """
+        Move the complete lines found in the output not consumed yet to
+        batch, without exceeding its max_lines.
+
+        :param _Lines_Batch batch:
+        """
+        if self.__newline_in_chunks:
+            self.__merge_output()
+
+        eol = self.__output.rfind("\n", self.__scanned)
+        if eol == -1:
+            self.__scanned = len(self.__output)
+            return
+
+        wanted = batch.max_lines - len(batch.lines)
+        lines = self.__output[self.__output_offset:eol].split("\n", wanted)
+        if len(lines) > wanted:
+            # The last element is the remaining lines, not consumed yet
+            eol -= len(lines.pop()) + 1
+
+        batch.lines.extend(lines)
+        self.__consume_output(eol + 1)
+
+    def __check_batch_and_resolve(self, batch):
+        """
+        Resolve the current promise with the lines read so far, if the batch
+        is full or no more line will be received.
+
+        :param _Lines_Batch batch:
+        """
+        self.__read_lines(batch)
+
+        if self.finished:
+            # The last line might not end with a newline
+            if len(batch.lines) < batch.max_lines:
+                self.__merge_output()
+                last = self.__consume_output(len(self.__output))
+                if last:
+                    batch.lines.append(last)
+            self.__resolve_batch(batch)
+
+        elif len(batch.lines) >= batch.max_lines:
+            self.__resolve_batch(batch)
+
+        elif batch.lines and batch.timeout_id is None and batch.max_ms > 0:
+            batch.timeout_id = GLib.timeout_add(
+                batch.max_ms, self.__on_batch_timeout, batch)
+
+    def __resolve_batch(self, batch):
+        """
+        Resolve the current promise with the lines of batch, or None if
+        there are none.
+
+        :param _Lines_Batch batch:
+        """
+        if batch.timeout_id is not None:
+            GLib.source_remove(batch.timeout_id)
+            batch.timeout_id = None
+        self.__resolve_promise(batch.lines or None)
+
+    def __on_batch_timeout(self, batch):
+        """
+        Called when the lines of batch have been waiting for too long.
+        """
+        batch.timeout_id = None
+        if self.__current_pattern is batch:
+            self.__resolve_promise(batch.lines)
+        return False
+
     def __resolve_promise(self, value):
         """
         Resolve the current promise with the given value.
@@ -627,11 +808,25 @@ class ProcessWrapper(object):
         of the tool, and resolve the promise if possible.
         """
         if self.__current_promise is not None:
-            p = self.__current_pattern.search(self.__output)
-            if p:
-                self.__output = self.__output[p.end(0):]
-                self.__resolve_promise(p.group(0))
-            elif self.finished:
+            if isinstance(self.__current_pattern, _Lines_Batch):
+                self.__check_batch_and_resolve(self.__current_pattern)
+                return
+
+            elif self.__current_pattern is None:
+                # Waiting for a line
+                eol = self.__search_line()
+                if eol != -1:
+                    self.__resolve_promise(self.__consume_output(eol + 1))
+                    return
+            else:
+                self.__merge_output()
+                p = self.__current_pattern.search(self.__output)
+                if p:
+                    self.__consume_output(p.end(0))
+                    self.__resolve_promise(p.group(0))
+                    return
+
+            if self.finished:
                 # We will never be able to match anyway
                 self.__resolve_promise(None)
 
@@ -643,7 +838,7 @@ class ProcessWrapper(object):
         """
         self.finished = True
         if self.__current_promise is not None:
-            self.__output += remaining_output
+            self.__append_output(remaining_output)
             self.__check_pattern_and_resolve()
 
         if self.__stream is not None:
@@ -675,15 +870,24 @@ class ProcessWrapper(object):
         :param int timeout: give up matching pattern after this many
            milliseconds, or wait for ever if 0.
         """
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern, re.MULTILINE)
+
+        return self.__wait(pattern, timeout)
+
+    def __wait(self, pattern, timeout=0, after_exit=False):
+        """
+        Implementation of wait_until_match. A pattern None waits for the next
+        complete line, without the need for a regular expression.
+
+        :param bool after_exit: whether to look at the output not consumed
+           yet even when the process has already terminated.
+        """
         # process has already terminated, return nothing
-        if self.finished:
+        if self.finished and not after_exit:
             return None
 
-        if isinstance(pattern, str):
-            self.__current_pattern = re.compile(pattern, re.MULTILINE)
-        else:
-            self.__current_pattern = pattern
-
+        self.__current_pattern = pattern
         p = self.__current_promise = Promise()
 
         # Can we resolve immediately ?
@@ -706,7 +910,7 @@ class ProcessWrapper(object):
         """
         p = Promise()
 
-        s = self.wait_until_match("^.*\n")
+        s = self.__wait(None)
         if s is None:
             p.resolve(None)   # already finished
         else:
@@ -714,6 +918,36 @@ class ProcessWrapper(object):
 
         return p
 
+    def wait_lines(self, max_lines=1000, max_ms=20):
+        """
+        Wait for several lines to be available, and return them as a list
+        of strings that do not include the trailing \n. This is much faster
+        than calling `wait_line` for each line when the process outputs a
+        lot of lines::
+
+            p = ProcessWrapper(...)
+            while True:
+                lines = yield p.wait_lines()
+                if lines is None:
+                    break
+                for line in lines:
+                    pass   # do something with the line
+
+        The promise is resolved as soon as max_lines lines are available, or
+        max_ms milliseconds after the first line was received, so that the
+        caller can display partial results while the process is running.
+        The lines not returned are kept for the next call, even after the
+        process has terminated.
+
+        :param int max_lines: the maximum number of lines in the list.
+        :param int max_ms: how long to wait for more lines once at least one
+           is available. 0 to wait until max_lines lines are available or
+           the process terminates.
+        :return: a promise, resolved with a non-empty list of lines, or None
+           when the process has terminated and all its output was returned.
+        """
+        return self.__wait(_Lines_Batch(max_lines, max_ms), after_exit=True)
+
     @property
     def stream(self):
         """
@@ -773,25 +1007,28 @@ class ProcessWrapper(object):
            the output.
         """
 
-        class map_to_line:
-            def __init__(self):
-                self.buffer = ""
-                self.__re = re.compile('^.*\n')
+        return self.stream.flatMap(_Line_Splitter())
 
-            def __call__(self, out_stream, output):
-                self.buffer += output
-                while True:
-                    p = self.__re.search(self.buffer)
-                    if not p:
-                        break
-                    out_stream.emit(p.group(0)[:-1])
-                    self.buffer = self.buffer[p.end(0):]
+    def stream_batches(self):
+        """
+        A stream that emits, each time some output becomes available, the
+        list of complete lines it contains. The trailing \n are removed.
+        This is similar to `lines`, but with one event per output chunk
+        rather than per line, which is much cheaper for tools that output
+        a lot of lines::
 
-            def oncompleted(self, out_stream, status):
-                if self.buffer:
-                    out_stream.emit(self.buffer)
+            def onbatch(lines):
+                for line in lines:
+                    pass   # do something with the line
 
-        return self.stream.flatMap(map_to_line())
+            @run_as_workflow
+            def execute():
+                p = ProcessWrapper(...)
+                yield p.stream_batches().subscribe(onbatch)
+
+        :returntype: a stream, resolved when the process terminates.
+        """
+        return self.stream.flatMap(_Line_Splitter(batches=True))
 
     def wait_until_terminate(self, show_if_error=False):
         """
@@ -824,7 +1061,6 @@ class ProcessWrapper(object):
         Called by GPS when it's timeout for a pattern to appear in output.
         """
         self.__resolve_promise(None)
-        self.__current_pattern = None
         return False
 
     def terminate(self):
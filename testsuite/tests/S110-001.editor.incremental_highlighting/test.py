@@ -0,0 +1,104 @@
+"""
+Replay a recorded stream of keystrokes over a large python buffer, and check
+that the damage-tracking mode of the highlighter engine leaves the buffer
+with the same tags as a full rehighlighting.
+The per-keystroke latency of both the incremental and the windowed modes is
+recorded in latency.out.
+"""
+
+import time
+from GPS import *
+from gps_utils.internal.utils import *
+from highlighter.engine import HighlighterModule
+
+NB_FUNCTIONS = 2000
+TEMPLATE = '''def func_{0}(self, a):
+    """ Documentation for function {0} """
+    # TODO: return something else
+    return a + {0}
+
+'''
+
+# The recorded keystrokes, as (line, column, text), sorted by decreasing line
+# so that typing one of them does not move the others.
+TYPED = [(6000, 10, "# comment"),
+         (4000, 1, '"""'),
+         (3000, 1, "\n\nclass A:\n"),
+         (2000, 5, "x = 'a'")]
+
+
+def keystrokes(content):
+    """
+    Return the stream of keystrokes typing TYPED in content, then erasing it
+    with backspaces, as a list of (offset, character). A character None
+    stands for a backspace.
+    """
+    line_offsets = [0]
+    for line in content.split("\n"):
+        line_offsets.append(line_offsets[-1] + len(line) + 1)
+
+    result = []
+    for line, column, text in TYPED:
+        offset = line_offsets[line - 1] + column - 1
+        result += [(offset + i, c) for i, c in enumerate(text)]
+    for line, column, text in reversed(TYPED):
+        offset = line_offsets[line - 1] + column - 1
+        result += [(offset + i, None) for i in range(len(text), 0, -1)]
+    return result
+
+
+def replay(gtk_ed, stream):
+    """ Replay stream on gtk_ed, and return the latency of each keystroke """
+    latencies = []
+    for offset, c in stream:
+        start = time.time()
+        if c is None:
+            start_it = gtk_ed.get_iter_at_offset(offset - 1)
+            gtk_ed.delete(start_it, gtk_ed.get_iter_at_offset(offset))
+        else:
+            gtk_ed.insert(gtk_ed.get_iter_at_offset(offset), c)
+        latencies.append(time.time() - start)
+    return latencies
+
+
+def rehighlight(buf, gtk_ed, hl):
+    gtk_ed.remove_all_tags(gtk_ed.get_start_iter(), gtk_ed.get_end_iter())
+    hl.gtk_highlight(gtk_ed)
+    return get_all_tags(buf)
+
+
+@run_test_driver
+def run_test():
+    content = "".join(TEMPLATE.format(i) for i in range(NB_FUNCTIONS))
+    with open("big.py", "w") as f:
+        f.write(content)
+    stream = keystrokes(content)
+
+    buf = EditorBuffer.get(File("big.py"))
+    yield wait_idle()
+
+    gtk_ed = get_gtk_buffer(buf)
+    hl = HighlighterModule.highlighters["python"]
+    text = buf.get_chars()
+    reference = rehighlight(buf, gtk_ed, hl)
+
+    hl.incremental = False
+    windowed = replay(gtk_ed, stream)
+    gps_assert(buf.get_chars(), text, "The keystroke stream is not neutral")
+    rehighlight(buf, gtk_ed, hl)
+
+    hl.incremental = True
+    incremental = replay(gtk_ed, stream)
+    gps_assert(get_all_tags(buf), reference,
+               "Incremental highlighting differs from a full highlighting")
+
+    with open("latency.out", "w") as f:
+        for mode, latencies in (("windowed", windowed),
+                                ("incremental", incremental)):
+            f.write("{0}: max {1:.2f}ms, mean {2:.2f}ms\n".format(
+                mode, max(latencies) * 1000,
+                sum(latencies) * 1000 / len(latencies)))
+            f.write("".join("  {0:.3f}\n".format(lat * 1000)
+                            for lat in latencies))
+
+    record_time(sum(incremental))
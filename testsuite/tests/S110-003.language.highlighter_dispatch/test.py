@@ -0,0 +1,101 @@
+"""
+Micro-benchmark of the classification of tokens in the highlighter engine.
+The bundled C, Python and CSS highlighters lex a sample text both with the
+matcher dispatch table of SubHighlighter and with a scan of all the groups
+of each match: both must classify the tokens identically. The timings are
+recorded in dispatch.out.
+"""
+
+import time
+from GPS import *
+from gps_utils.internal.utils import *
+from highlighter.engine import HighlighterModule, RegionMatcher, null_span
+
+NB_REPEATS = 200
+
+SAMPLES = {
+    "c": '''
+#include <stdio.h>
+/* A multiline
+   comment TODO: fix */
+int main (int argc, char **argv)
+{
+   char c = '\\n';
+   float f = 3.14;  // a comment
+   printf ("hello %d\\n", argc);
+   return 0;
+}
+''',
+    "python": '''
+class Foo(object):
+    """ Documentation with {0} escapes """
+    def method(self, a=None):
+        # NOTE: a comment
+        return isinstance(a, int) and a + 0.5 or "str\\n"
+''',
+    "css": '''
+/* a comment */
+body .class > a:hover {
+    background-color: #FFFFFF;
+    border: 1px solid red;
+    font-family: "Arial", sans-serif;
+    margin: 0 auto !important;
+}
+'''}
+
+
+def scan_groups(hl, m):
+    return [j for j in range(1, len(hl.matchers) + 1)
+            if m.span(j) != null_span][0] - 1
+
+
+def dispatch(hl, m):
+    return hl.matcher_index[m.lastindex]
+
+
+def lex(root, text, classify):
+    """
+    Lex text with the root highlighter, following regions like the engine
+    does, and return the list of (matcher index, start, end).
+    """
+    result = []
+    stack = [root]
+    offset = 0
+
+    while offset < len(text):
+        hl = stack[-1]
+        m = hl.pattern.search(text, offset)
+        if m is None:
+            break
+
+        i = classify(hl, m)
+        result.append((i, m.start(), m.end()))
+        offset = max(m.end(), offset + 1)
+        matcher = hl.matchers[i]
+
+        if matcher is None:
+            stack.pop()
+        elif isinstance(matcher, RegionMatcher):
+            stack.append(matcher.subhighlighter)
+
+    return result
+
+
+@run_test_driver
+def run_test():
+    with open("dispatch.out", "w") as out:
+        for lang in sorted(SAMPLES):
+            root = HighlighterModule.highlighters[lang].root_highlighter
+            text = SAMPLES[lang] * NB_REPEATS
+            timings = []
+
+            for classify in (scan_groups, dispatch):
+                start = time.time()
+                tokens = lex(root, text, classify)
+                timings.append((time.time() - start, tokens))
+
+            gps_assert(timings[1][1], timings[0][1],
+                       "Tokens classified differently for " + lang)
+            out.write("{0}: {1} tokens, scan {2:.3f}s, dispatch {3:.3f}s\n"
+                      .format(lang, len(timings[0][1]),
+                              timings[0][0], timings[1][0]))
@@ -0,0 +1,58 @@
+"""
+Check that opening a large python file only highlights the visible lines
+right away, that the background highlighting, interrupted by an edit,
+ends up with the same tags as a full highlighting, and that it stops when
+the editor is closed.
+"""
+
+from GPS import *
+from gps_utils.internal.utils import *
+from highlighter.engine import HighlighterModule, idle_highlighted
+
+NB_FUNCTIONS = 4000
+TEMPLATE = '''def func_{0}(self, a):
+    """ Documentation for function {0}
+    on two lines """
+    return a + {0}  # a comment
+
+'''
+
+
+@run_test_driver
+def run_test():
+    with open("big.py", "w") as f:
+        # Start with an unterminated string region, to check that the lines
+        # highlighted first are corrected by the background highlighting.
+        f.write('"""\n')
+        f.write("".join(TEMPLATE.format(i) for i in range(NB_FUNCTIONS)))
+
+    buf = EditorBuffer.get(File("big.py"))
+    gtk_ed = get_gtk_buffer(buf)
+    gps_assert(gtk_ed.next_highlight_line is not None, True,
+               "The highlighting should continue in the background")
+
+    buf.insert(buf.at(2, 1), "x = 1\n")
+    for _ in range(100):
+        if gtk_ed.next_highlight_line is None:
+            break
+        yield timeout(100)
+
+    gps_assert(gtk_ed.next_highlight_line, None,
+               "The background highlighting should be completed")
+
+    tags = get_all_tags(buf)
+    gtk_ed.remove_all_tags(gtk_ed.get_start_iter(), gtk_ed.get_end_iter())
+    HighlighterModule.highlighters["python"].gtk_highlight(gtk_ed)
+    gps_assert(tags, get_all_tags(buf),
+               "Lazy highlighting differs from a full highlighting")
+
+    # Closing an editor stops its background highlighting
+    with open("big2.py", "w") as f:
+        f.write("".join(TEMPLATE.format(i) for i in range(NB_FUNCTIONS)))
+    buf = EditorBuffer.get(File("big2.py"))
+    gtk_ed = get_gtk_buffer(buf)
+    gps_assert(id(gtk_ed) in idle_highlighted, True,
+               "The second file should be highlighted in the background")
+    buf.close(force=True)
+    gps_assert(id(gtk_ed) in idle_highlighted, False,
+               "The background highlighting should stop on close")
@@ -0,0 +1,118 @@
+"""
+Check that the highlighting of a large file is restored from the on-disk
+cache when the file is opened again, that stale or corrupt entries are
+ignored, and that the least recently used entries are evicted when the
+cache grows beyond its size limit.
+"""
+
+import json
+import os
+import zlib
+from GPS import *
+from gps_utils.internal.utils import *
+from highlighter import cache
+
+NB_FUNCTIONS = 4000
+TEMPLATE = '''def func_{0}(self, a):
+    """ Documentation for function {0}
+    on two lines """
+    return a + {0}  # a comment
+
+'''
+
+
+def entries():
+    return sorted(name for name in os.listdir(cache.cache_dir())
+                  if not name.endswith(".tmp"))
+
+
+def write_entry(path, entry):
+    with open(path, "wb") as f:
+        f.write(zlib.compress(json.dumps(entry)))
+
+
+@run_test_driver
+def run_test():
+    GPS.Preference(cache.CACHE_SIZE_PREF).set(50)
+    if os.path.isdir(cache.cache_dir()):
+        for name in os.listdir(cache.cache_dir()):
+            os.remove(os.path.join(cache.cache_dir(), name))
+
+    with open("big.py", "w") as f:
+        f.write("".join(TEMPLATE.format(i) for i in range(NB_FUNCTIONS)))
+
+    # The first opening highlights the file and stores the result
+
+    buf = EditorBuffer.get(File("big.py"))
+    gtk_ed = get_gtk_buffer(buf)
+    gps_assert(gtk_ed.next_highlight_line is not None, True,
+               "The first opening should highlight in the background")
+    for _ in range(100):
+        if gtk_ed.next_highlight_line is None:
+            break
+        yield timeout(100)
+    tags = get_all_tags(buf)
+    gps_assert(len(entries()), 1, "The highlighting should be stored")
+    path = os.path.join(cache.cache_dir(), entries()[0])
+    buf.close(force=True)
+
+    # The second opening restores it without highlighting the file
+
+    buf = EditorBuffer.get(File("big.py"))
+    gtk_ed = get_gtk_buffer(buf)
+    gps_assert(gtk_ed.next_highlight_line, None,
+               "The highlighting should be restored from the cache")
+    gps_assert(get_all_tags(buf), tags,
+               "The restored highlighting differs from the stored one")
+    buf.close(force=True)
+
+    # Corrupt and stale entries are ignored, and replaced
+
+    with open(path, "wb") as f:
+        f.write("not a compressed entry")
+    gps_assert(cache.load(entries()[0][:-len(".json.z")]), None,
+               "A corrupt entry should be ignored")
+    buf = EditorBuffer.get(File("big.py"))
+    gtk_ed = get_gtk_buffer(buf)
+    gps_assert(gtk_ed.next_highlight_line is not None, True,
+               "A corrupt entry should not be restored")
+    for _ in range(100):
+        if gtk_ed.next_highlight_line is None:
+            break
+        yield timeout(100)
+    gps_assert(get_all_tags(buf), tags,
+               "Wrong highlighting after a corrupt entry")
+    buf.close(force=True)
+
+    with open(path, "rb") as f:
+        entry = json.loads(zlib.decompress(f.read()))
+    entry["version"] = cache.FORMAT_VERSION - 1
+    write_entry(path, entry)
+    buf = EditorBuffer.get(File("big.py"))
+    gtk_ed = get_gtk_buffer(buf)
+    gps_assert(gtk_ed.next_highlight_line is not None, True,
+               "An entry in an older format should not be restored")
+    buf.close(force=True)
+
+    # The least recently used entries are evicted, and temporary files left
+    # by an interrupted save do not count toward the limit
+
+    for name in os.listdir(cache.cache_dir()):
+        os.remove(os.path.join(cache.cache_dir(), name))
+    GPS.Preference(cache.CACHE_SIZE_PREF).set(1)
+    padding = "x" * (400 * 1024)
+    for i, name in enumerate(["old", "middle", "recent"]):
+        p = os.path.join(cache.cache_dir(), name + ".json.z")
+        with open(p, "wb") as f:
+            f.write(padding)
+        os.utime(p, (1000 * (i + 1), 1000 * (i + 1)))
+    with open(os.path.join(cache.cache_dir(), "interrupted.json.z.tmp"),
+              "wb") as f:
+        f.write(padding + padding)
+
+    cache.save("new", {"lines": [], "stacks": [], "tags": {}})
+    gps_assert(sorted(os.listdir(cache.cache_dir())),
+               ["middle.json.z", "new.json.z", "recent.json.z"],
+               "Only the least recently used entry should be evicted")
+    gps_assert(cache.load("new")["lines"], [],
+               "The new entry should be stored")
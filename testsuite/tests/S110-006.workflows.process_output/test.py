@@ -0,0 +1,102 @@
+"""
+Benchmark the handling of a large output by ProcessWrapper: a fake
+GPS.Process emits one million lines, which are read through wait_line,
+wait_lines, the lines stream and stream_batches. The timings are recorded
+in process.out.
+"""
+
+import time
+from GPS import *
+from gps_utils.internal.utils import *
+from gi.repository import GLib
+from workflows.promises import ProcessWrapper
+
+NB_LINES = 1000000
+LINES_PER_CHUNK = 50
+CHUNKS_PER_IDLE = 100
+CHUNK = "".join("commit {0:040d} some text\n".format(i)
+                for i in range(LINES_PER_CHUNK))
+
+
+class Fake_Process(object):
+    """
+    Replaces GPS.Process, and sends NB_LINES lines of output to the
+    callbacks of ProcessWrapper, by chunks, from idle callbacks.
+    """
+
+    def __init__(self, on_match, on_exit, **kwargs):
+        self.on_match = on_match
+        self.on_exit = on_exit
+        self.sent = 0
+        GLib.idle_add(self.__feed)
+
+    def __feed(self):
+        for _ in range(CHUNKS_PER_IDLE):
+            if self.sent == NB_LINES:
+                self.on_exit(self, 0, "")
+                return False
+            self.on_match(self, CHUNK, "")
+            self.sent += LINES_PER_CHUNK
+        return True
+
+    def interrupt(self):
+        pass
+
+
+def read_with_wait_line():
+    p = ProcessWrapper(["fake"])
+    count = 0
+    while True:
+        line = yield p.wait_line()
+        if line is None:
+            break
+        count += 1
+    yield count
+
+
+def read_with_wait_lines():
+    p = ProcessWrapper(["fake"])
+    count = 0
+    while True:
+        lines = yield p.wait_lines()
+        if lines is None:
+            break
+        count += len(lines)
+    yield count
+
+
+def read_with_lines():
+    p = ProcessWrapper(["fake"])
+    received = []
+    yield p.lines.subscribe(lambda line: received.append(line))
+    yield len(received)
+
+
+def read_with_stream_batches():
+    p = ProcessWrapper(["fake"])
+    received = []
+    yield p.stream_batches().subscribe(lambda lines: received.extend(lines))
+    yield len(received)
+
+
+@run_test_driver
+def run_test():
+    process = GPS.Process
+    GPS.Process = Fake_Process
+
+    try:
+        with open("process.out", "w") as out:
+            for name, reader in (
+                    ("wait_line", read_with_wait_line),
+                    ("wait_lines", read_with_wait_lines),
+                    ("lines", read_with_lines),
+                    ("stream_batches", read_with_stream_batches)):
+                start = time.time()
+                count = yield reader()
+                elapsed = time.time() - start
+
+                gps_assert(count, NB_LINES, "Lines lost with " + name)
+                out.write("{0}: {1} lines in {2:.2f}s\n".format(
+                    name, count, elapsed))
+    finally:
+        GPS.Process = process
@@ -0,0 +1,45 @@
+"""
+Check that the background highlighters adapt the number of lines they
+process in each iteration to their time budget: a large file should be
+highlighted in far fewer iterations than with fixed batches. The
+statistics are recorded in highlighter.out.
+"""
+
+from GPS import *
+from gps_utils.internal.utils import *
+from gps_utils.highlighter import Regexp_Highlighter, OverlayStyle
+
+NB_LINES = 50000
+
+
+class Todo_Highlighter(Regexp_Highlighter):
+    synchronous = True
+
+    def must_highlight(self, buffer):
+        return buffer.file().base_name() == "big.txt"
+
+
+@run_test_driver
+def run_test():
+    with open("big.txt", "w") as f:
+        for i in range(NB_LINES):
+            if i % 50 == 0:
+                f.write("TODO: line {0}\n".format(i))
+            else:
+                f.write("some text on line {0}\n".format(i))
+
+    EditorBuffer.get(File("big.txt"))
+    h = Todo_Highlighter(
+        regexp="TODO.*", style=OverlayStyle(name="todo", background="red"))
+    h.stop()
+
+    with open("highlighter.out", "w") as out:
+        out.write("{0} lines in {1} slices, {2:.0f} lines/s,"
+                  " longest slice {3:.1f}ms\n".format(
+                      h.lines_processed, h.slices, h.lines_per_second(),
+                      h.max_slice_duration * 1000))
+
+    gps_assert(h.lines_processed >= NB_LINES, True,
+               "The whole buffer should have been processed")
+    gps_assert(h.slices < NB_LINES / Todo_Highlighter.batch_size, True,
+               "The batches should grow to fit the time budget")
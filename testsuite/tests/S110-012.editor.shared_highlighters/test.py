@@ -0,0 +1,70 @@
+"""
+Check that several Regexp_Highlighter and Text_Highlighter share a single
+scanner, that each of them still highlights its own matches, and that
+rescanning does not duplicate the messages of the styles that use them.
+"""
+
+from GPS import *
+from gps_utils.internal.utils import *
+from gps_utils import highlighter
+from gps_utils.highlighter import (
+    Regexp_Highlighter, Text_Highlighter, OverlayStyle)
+
+
+@run_test_driver
+def run_test():
+    with open("foo.txt", "w") as f:
+        f.write("TODO: fix this\nfoo bar xfoo Foo\n")
+
+    buf = EditorBuffer.get(File("foo.txt"))
+    todo = Regexp_Highlighter(
+        regexp="TODO.*", style=OverlayStyle(name="todo", background="red"))
+    foo = Text_Highlighter(
+        text="foo", whole_word=True,
+        style=OverlayStyle(name="foo", background="blue"))
+
+    gps_assert(todo in highlighter._scanner.clients and
+               foo in highlighter._scanner.clients, True,
+               "Both highlighters should use the shared scanner")
+
+    yield wait_idle()
+    yield timeout(500)
+
+    todo_overlay = buf.create_overlay("todo")
+    foo_overlay = buf.create_overlay("foo")
+
+    gps_assert(buf.at(1, 1).has_overlay(todo_overlay), True,
+               "TODO should be highlighted")
+    gps_assert(buf.at(1, 14).has_overlay(todo_overlay), True,
+               "The whole TODO line should be highlighted")
+    gps_assert(buf.at(2, 1).has_overlay(foo_overlay), True,
+               "foo should be highlighted")
+    gps_assert(buf.at(2, 10).has_overlay(foo_overlay), False,
+               "xfoo is not a whole word match")
+    gps_assert(buf.at(2, 14).has_overlay(foo_overlay), True,
+               "The search should not be case sensitive")
+    gps_assert(buf.at(2, 1).has_overlay(todo_overlay), False,
+               "Styles should not be mixed between highlighters")
+
+    todo.stop()
+    foo.stop()
+    gps_assert(buf.at(1, 1).has_overlay(todo_overlay), False,
+               "Stopping a highlighter should remove its highlighting")
+
+    # A style using messages: rescanning replaces the previous messages
+    marks = Regexp_Highlighter(
+        regexp="TODO", style=OverlayStyle(
+            name="todo marks", background="green", speedbar=True))
+    yield wait_idle()
+    yield timeout(500)
+    count = len(GPS.Message.list(category="todo marks"))
+    gps_assert(count, 1, "The TODO should be marked once")
+
+    for _ in range(2):
+        buf.insert(buf.at(2, 1), " ")
+        buf.save(interactive=False)
+        yield wait_idle()
+        yield timeout(500)
+        gps_assert(len(GPS.Message.list(category="todo marks")), count,
+                   "Rescanning should not duplicate the messages")
+    marks.stop()
@@ -0,0 +1,65 @@
+"""
+Benchmark the search for occurrences of the word under the cursor in
+auto_highlight_occurrences against the character loop it replaces, on a
+50000 lines text. The results must be the same, and the timings are
+recorded in scan.out.
+"""
+
+import time
+from GPS import *
+from gps_utils.internal.utils import *
+from auto_highlight_occurrences import find_word_occurrences
+
+NB_LINES = 50000
+LINE = u"   if Counter_{0} > 16#FF# then Counter := Counter + 1; end if;\n"
+
+
+def char_loop(text, word, first_line):
+    """The former implementation, line by line and character by character"""
+    result = []
+    for nb, s in enumerate(text.split(u"\n")):
+        index = 0
+        visible_column = 0
+        s_len = len(s)
+        while index < s_len:
+            if s[index].isalpha() or s[index] == '_':
+                end_index = index + 1
+                while end_index < s_len and (
+                        s[end_index].isalnum() or s[end_index] == '_'):
+                    end_index += 1
+                if s[index:end_index] == word:
+                    result.append(
+                        (first_line + nb, visible_column + 1, len(word)))
+                visible_column += end_index - index
+                index = end_index
+            else:
+                visible_column += 1
+                index += 1
+    return result
+
+
+@run_test_driver
+def run_test():
+    text = u"".join(LINE.format(i % 7) for i in range(NB_LINES))
+
+    start = time.time()
+    expected = char_loop(text, u"Counter", 1)
+    loop_time = time.time() - start
+
+    start = time.time()
+    found = find_word_occurrences(text, u"Counter", 1)
+    scan_time = time.time() - start
+
+    gps_assert(found == expected, True,
+               "The scan should find the same occurrences as the loop")
+    gps_assert(len(found), 2 * NB_LINES, "Wrong number of occurrences")
+
+    gps_assert(find_word_occurrences(text, u"Counter", 1, limit=10),
+               expected[:10], "The limit should apply during the scan")
+    gps_assert(find_word_occurrences(u"\tFF 16#FF#", u"FF", 3),
+               [(3, 9, 2), (3, 15, 2)],
+               "Wrong columns with tabs and based numbers")
+
+    with open("scan.out", "w") as out:
+        out.write("char loop: {0:.3f}s, scan: {1:.3f}s\n".format(
+            loop_time, scan_time))
@@ -0,0 +1,66 @@
+"""
+Check that the references computed by auto_highlight_occurrences are kept
+per file, and forgotten when the file is modified or when too many files
+have been seen.
+"""
+
+from GPS import *
+from gps_utils.internal.utils import *
+from auto_highlight_occurrences import References_Cache
+
+
+class Location(object):
+
+    def __init__(self, line, column):
+        self.__line = line
+        self.__column = column
+
+    def line(self):
+        return self.__line
+
+    def column(self):
+        return self.__column
+
+
+class Entity(object):
+    """Counts the queries to the cross-references database"""
+
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+
+    def references(self, include_implicit, synchronous, in_file):
+        self.queries += 1
+        return [Location(12, 4), Location(3, 10), Location(3, 2)]
+
+
+@run_test_driver
+def run_test():
+    cache = References_Cache(size=2)
+    foo = Entity("foo")
+    a = File("a.adb")
+    b = File("b.adb")
+    c = File("c.adb")
+
+    refs = cache.references(foo, a)
+    gps_assert([(line, col) for line, col, _ in refs],
+               [(3, 2), (3, 10), (12, 4)],
+               "References should be sorted")
+    cache.references(foo, a)
+    gps_assert(foo.queries, 1, "The second query should use the cache")
+
+    cache.invalidate(a)
+    cache.references(foo, a)
+    gps_assert(foo.queries, 2, "An invalidated file should be queried again")
+
+    cache.references(foo, b)
+    cache.references(foo, a)
+    cache.references(foo, c)
+    gps_assert(len(cache), 2, "The cache should be bounded")
+    cache.references(foo, a)
+    gps_assert(foo.queries, 4, "The most recently used file should be kept")
+    cache.references(foo, b)
+    gps_assert(foo.queries, 5, "The least recently used file should go")
+
+    cache.invalidate()
+    gps_assert(len(cache), 0, "The cache should be empty")
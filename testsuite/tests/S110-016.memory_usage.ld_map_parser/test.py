@@ -0,0 +1,101 @@
+"""
+Parse a map file generated by ld with the memory usage provider, and check
+the regions, sections and modules found. The time taken to parse
+a large map file is recorded in ld.out.
+"""
+
+import os
+import time
+from GPS import *
+from gps_utils.internal.utils import *
+from memory_usage_providers.ld import parse_map_file
+
+MAP = """Memory Configuration
+
+Name             Origin             Length             Attributes
+flash            0x08000000         0x00100000         xr
+sram             0x20000000         0x00020000         xrw
+*default*        0x00000000         0xffffffff
+
+Linker script and memory map
+
+.text           0x08000000      0x200
+ .text          0x08000000      0x100 main.o
+                0x08000000                main
+                0x08000010                helper
+ .text          0x08000100      0x100 /lib/libgnat.a(a-except.o)
+                0x08000100                __gnat_raise
+                0x08000180                PROVIDE (end = .)
+.data           0x20000000       0x10 load address 0x08000200
+ .data          0x20000000       0x10 main.o
+.debug_info     0x00000000      0x500
+ .debug_info    0x00000000      0x500 main.o
+"""
+
+NB_MODULES = 50000
+
+
+@run_test_driver
+def run_test():
+    map_dir = os.path.abspath("obj")
+    if not os.path.isdir(map_dir):
+        os.mkdir(map_dir)
+    map_file = os.path.join(map_dir, "map.txt")
+
+    with open(map_file, "w") as f:
+        f.write(MAP)
+
+    result = yield parse_map_file(map_file)
+    main_o = os.path.join(map_dir, "main.o")
+
+    gps_assert(result.regions,
+               [("flash", "0x08000000", 0x100000),
+                ("sram", "0x20000000", 0x20000)],
+               "Wrong regions")
+    gps_assert(result.sections,
+               [(".text", "0x08000000", 0x200, "flash"),
+                (".data", "0x20000000", 0x10, "sram")],
+               "Only the allocated sections should be kept")
+    gps_assert(sorted(result.modules),
+               [("a-except.o", "/lib/libgnat.a", "0x08000100", 0x100,
+                 "flash", ".text"),
+                (main_o, "", "0x08000000", 0x100, "flash", ".text"),
+                (main_o, "", "0x20000000", 0x10, "sram", ".data")],
+               "Wrong modules")
+    gps_assert(result.region_name_from_address(0x20000010), "sram",
+               "Wrong region for an address")
+    gps_assert(result.region_name_from_address(0x30000000), "",
+               "No region should contain this address")
+
+    # With overlapping regions, the first one in the map file is used
+    with open(map_file, "w") as f:
+        f.write(MAP.replace(
+            "sram ",
+            "ccm              0x20000000         0x00010000         xrw\n"
+            "sram "))
+
+    result = yield parse_map_file(map_file)
+    gps_assert(result.region_name_from_address(0x20000010), "ccm",
+               "The first region containing the address should be used")
+    gps_assert(result.region_name_from_address(0x20010010), "sram",
+               "Wrong region for an address after the overlap")
+
+    # A large map file
+    with open(map_file, "w") as f:
+        f.write(MAP.split(".text")[0])
+        f.write(".text           0x08000000      0x{0:x}\n".format(
+            NB_MODULES * 0x10))
+        for i in range(NB_MODULES):
+            f.write(" .text          0x{0:08x}       0x10 unit{1}.o\n"
+                    "                0x{0:08x}                unit{1}\n"
+                    .format(0x08000000 + i * 0x10, i))
+
+    start = time.time()
+    result = yield parse_map_file(map_file)
+    elapsed = time.time() - start
+
+    gps_assert(len(result.modules), NB_MODULES, "Wrong number of modules")
+
+    with open("ld.out", "w") as out:
+        out.write("{0} modules parsed in {1:.3f}s\n".format(
+            NB_MODULES, elapsed))
@@ -0,0 +1,58 @@
+"""
+Check that the dependency graph of the filedeps plugin returns the shortest
+chain of dependencies, only queries the imports of each file once, and
+forgets them after a compilation.
+"""
+
+from GPS import *
+from gps_utils.internal.utils import *
+from filedeps import Dependency_Graph
+
+# main.adb -> a.ads -> b.ads -> c.ads -> d.ads, and main.adb -> d.ads via
+# its spec main.ads
+IMPORTS = {"main.adb": ["a.ads"],
+           "main.ads": ["d.ads"],
+           "a.ads": ["b.ads"],
+           "b.ads": ["c.ads"],
+           "c.ads": ["d.ads"],
+           "d.ads": []}
+
+
+class Source(object):
+    """Counts the queries to the cross-references database"""
+
+    queries = 0
+
+    def __init__(self, name):
+        self.path = name
+
+    def imports(self, include_implicit, include_system):
+        Source.queries += 1
+        return [FILES[f] for f in IMPORTS[self.path]]
+
+    def other_file(self):
+        return FILES[self.path[:-1] + "s"]
+
+
+FILES = {name: Source(name) for name in IMPORTS}
+
+
+@run_test_driver
+def run_test():
+    graph = Dependency_Graph()
+
+    path = graph.shortest_path(FILES["main.adb"], FILES["d.ads"])
+    gps_assert([f.path for f in path], ["main.adb", "main.ads", "d.ads"],
+               "The shortest path should go through the spec")
+    gps_assert(graph.shortest_path(FILES["d.ads"], FILES["a.ads"]), None,
+               "d.ads does not depend on a.ads")
+
+    queries = Source.queries
+    graph.shortest_path(FILES["main.adb"], FILES["c.ads"])
+    gps_assert(Source.queries, queries,
+               "The imports should only be queried once")
+
+    graph.clear()
+    graph.shortest_path(FILES["main.adb"], FILES["main.ads"])
+    gps_assert(Source.queries > queries, True,
+               "The imports should be queried again after clear")
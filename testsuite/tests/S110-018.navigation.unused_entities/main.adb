@@ -0,0 +1,6 @@
+with Pack;
+
+procedure Main is
+begin
+   Pack.Used;
+end Main;
@@ -0,0 +1,13 @@
+package body Pack is
+
+   procedure Used is
+   begin
+      Used_Var := Used_Var + 1;
+   end Used;
+
+   procedure Unused is
+   begin
+      null;
+   end Unused;
+
+end Pack;
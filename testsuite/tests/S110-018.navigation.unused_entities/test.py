@@ -0,0 +1,38 @@
+"""
+Check that the bulk search for unused entities reports the same entities
+as the search that queries the references of each entity, including for
+packages and subprograms with end labels.
+"""
+
+from GPS import *
+from gps_utils.internal.utils import *
+import unused_entities
+
+
+def reported():
+    return sorted(m.get_text() for m in
+                  GPS.Message.list(category=unused_entities.CATEGORY))
+
+
+@run_test_driver
+def run_test():
+    GPS.BuildTarget("Build All").execute()
+    yield wait_tasks()
+
+    GPS.Preference("Plugins/unused_entities/bulk").set(False)
+    unused_entities.show_unused_entities(None, True)
+    one_by_one = reported()
+
+    GPS.Preference("Plugins/unused_entities/bulk").set(True)
+    unused_entities.show_unused_entities(None, True)
+    yield wait_tasks()
+    bulk = reported()
+
+    gps_assert(bulk, one_by_one,
+               "Both searches should report the same entities")
+    gps_assert("unused entity Unused" in one_by_one, True,
+               "Unused should be reported")
+    gps_assert("unused entity Unused_Var" in one_by_one, True,
+               "Unused_Var should be reported")
+    gps_assert("unused entity Used" in one_by_one, False,
+               "Used should not be reported")
@@ -0,0 +1,42 @@
+"""
+Benchmark the startup cost of the libclang bindings: the time to import
+clang.cindex and load libclang, then to get the first diagnostic of a file.
+The registration of all the function prototypes at once is also timed for
+comparison. The timings are recorded in cindex.out.
+"""
+
+import imp
+import os
+import time
+import clang.cindex
+from GPS import *
+from gps_utils.internal.utils import *
+
+
+@run_test_driver
+def run_test():
+    # Load a separate instance of the module, so that the libclang library
+    # is loaded again
+    path = os.path.join(os.path.dirname(clang.cindex.__file__), "cindex.py")
+
+    start = time.time()
+    cindex = imp.load_source("cindex_startup", path)
+    import_time = time.time() - start
+
+    start = time.time()
+    tu = cindex.Index.create().parse("main.c")
+    diagnostics = [d.spelling for d in tu.diagnostics]
+    diagnostic_time = time.time() - start
+
+    gps_assert(len(diagnostics), 1, "Wrong number of diagnostics")
+    gps_assert("undefined_variable" in diagnostics[0], True,
+               "Wrong diagnostic: {}".format(diagnostics[0]))
+
+    start = time.time()
+    cindex.register_functions(cindex.conf.get_cindex_library(), True)
+    register_time = time.time() - start
+
+    with open("cindex.out", "w") as out:
+        out.write("import: {0:.4f}s, first diagnostic: {1:.4f}s,"
+                  " registering all functions: {2:.4f}s\n".format(
+                      import_time, diagnostic_time, register_time))
@@ -0,0 +1,71 @@
+"""
+Check Cursor.find_descendants against a recursive walk with get_children,
+and record the time taken by both to find the function declarations of a
+large translation unit in traversal.out.
+"""
+
+import time
+from clang.cindex import Index, CursorKind
+from GPS import *
+from gps_utils.internal.utils import *
+
+NB_FUNCTIONS = 2000
+FUNCTION = """
+struct s{0} {{ int a; int b; }};
+static int f{0} (int x)
+{{
+  struct s{0} v = {{x, x + 1}};
+  if (v.a > v.b) {{ return v.a; }} else {{ return v.b * {0}; }}
+}}
+"""
+
+
+def recursive_walk(cursor, kind):
+    """The walk with nested generators, as done by walk_preorder"""
+    for child in cursor.get_children():
+        if child.kind == kind:
+            yield child
+        for descendant in recursive_walk(child, kind):
+            yield descendant
+
+
+@run_test_driver
+def run_test():
+    with open("large.c", "w") as f:
+        for i in range(NB_FUNCTIONS):
+            f.write(FUNCTION.format(i))
+
+    tu = Index.create().parse("large.c")
+    root = tu.cursor
+
+    start = time.time()
+    expected = [c.spelling for c in recursive_walk(
+        root, CursorKind.FUNCTION_DECL)]
+    recursive_time = time.time() - start
+
+    start = time.time()
+    found = [c.spelling for c in root.find_descendants(
+        kinds=[CursorKind.FUNCTION_DECL])]
+    walk_time = time.time() - start
+
+    gps_assert(found, expected, "Both walks should find the same functions")
+    gps_assert(len(found), NB_FUNCTIONS, "Wrong number of functions")
+
+    gps_assert([c.spelling for c in root.find_descendants(max_depth=1)],
+               [c.spelling for c in root.get_children()],
+               "max_depth=1 should return the children")
+    gps_assert(
+        [c.spelling for c in root.find_descendants(
+            kinds=[CursorKind.FIELD_DECL], max_depth=2)][:2],
+        ["a", "b"],
+        "The fields are two levels below the translation unit")
+    gps_assert(root.find_descendants(
+        kinds=[CursorKind.FIELD_DECL], max_depth=1), [],
+        "The fields are not children of the translation unit")
+    gps_assert(sum(1 for _ in root.walk_preorder()),
+               1 + len(root.find_descendants()),
+               "walk_preorder should visit the root and all descendants")
+
+    with open("traversal.out", "w") as out:
+        out.write("recursive walk: {0:.3f}s, find_descendants: {1:.3f}s\n"
+                  .format(recursive_time, walk_time))
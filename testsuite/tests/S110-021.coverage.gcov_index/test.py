@@ -0,0 +1,31 @@
+"""
+Check the indexing of the .gcda and .gcno files found in the object
+directories by the gcov plugin.
+"""
+
+import os
+from GPS import *
+from gps_utils.internal.utils import *
+from gcov import index_coverage_files
+
+
+def create(directory, *names):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for name in names:
+        open(os.path.join(directory, name), "w").close()
+    return directory
+
+
+@run_test_driver
+def run_test():
+    obj1 = create(os.path.abspath("obj1"), "a.gcda", "a.gcno", "b.gcno",
+                  "a.o", "b.ali")
+    obj2 = create(os.path.abspath("obj2"), "a.gcda", "c.gcda", "c.gcno")
+
+    gcda_dirs, gcno_units = index_coverage_files(
+        [obj1, obj2, os.path.abspath("missing")])
+
+    gps_assert(gcda_dirs, {"a": obj1, "c": obj2},
+               "The first object directory should take precedence")
+    gps_assert(gcno_units, set(["a", "b", "c"]), "Wrong .gcno files")
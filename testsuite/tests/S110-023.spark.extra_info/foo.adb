@@ -0,0 +1,5 @@
+procedure Foo is
+begin
+   null;
+   null;
+end Foo;
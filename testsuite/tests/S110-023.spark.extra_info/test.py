@@ -0,0 +1,76 @@
+"""
+Check that the .spark files are read on demand, with only the most recently
+used ones kept in memory, that they are forgotten when GNATprove runs
+again, and that the trace file of a message is only read when its action
+is executed.
+"""
+
+import json
+import os
+from GPS import *
+from gps_utils.internal.utils import *
+import spark2014
+from spark2014 import Spark_Files, GNATprove_Parser, spark_files
+
+
+def write_spark(name, rule):
+    with open(name, "w") as f:
+        json.dump({"proof": [{"msg_id": 1, "rule": rule}]}, f)
+    return os.path.abspath(name)
+
+
+def write_trace(line):
+    with open("foo.trace", "w") as f:
+        f.write("foo.adb:%d:1\n" % line)
+
+
+def trace_lines():
+    return [sloc.line() for sloc in spark2014.trace_lines or []]
+
+
+@run_test_driver
+def run_test():
+    a = write_spark("a.spark", "A")
+    b = write_spark("b.spark", "B")
+    c = write_spark("c.spark", "C")
+
+    files = Spark_Files(size=2)
+    gps_assert(files.get(a, 1)["rule"], "A", "Wrong extra info")
+    gps_assert(files.get(a, 2), {}, "No extra info for an unknown id")
+    files.get(b, 1)
+    files.get(a, 1)
+    files.get(c, 1)
+    gps_assert(len(files), 2, "Only two files should be kept in memory")
+
+    # b was the least recently used file, and is parsed again
+    write_spark("a.spark", "A2")
+    write_spark("b.spark", "B2")
+    gps_assert(files.get(a, 1)["rule"], "A", "a should still be in memory")
+    gps_assert(files.get(b, 1)["rule"], "B2", "b should be parsed again")
+
+    files.clear()
+    gps_assert(len(files), 0, "All files should be forgotten")
+    gps_assert(files.get(a, 1)["rule"], "A2", "a should be parsed again")
+
+    # A new run of GNATprove forgets the files of the previous one
+    spark_files.get(a, 1)
+    parser = GNATprove_Parser(None)
+    gps_assert(len(spark_files), 0,
+               "The files should be forgotten on a new run")
+
+    # The trace file is only read when the action of the message is
+    # executed, and only the first time.
+    write_trace(2)
+    m = Message(spark2014.messages_category, File("foo.adb"), 3, 4,
+                "medium: assertion might fail", 0)
+    parser.act_on_extra_info(m, {"tracefile": "foo.trace"},
+                             os.path.abspath("."), None)
+    write_trace(3)
+    m.execute_action()
+    gps_assert(trace_lines(), [3],
+               "The trace file should be read when the action executes")
+    m.execute_action()
+    write_trace(4)
+    m.execute_action()
+    gps_assert(trace_lines(), [3],
+               "The trace file should only be read the first time")
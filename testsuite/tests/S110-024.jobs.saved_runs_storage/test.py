@@ -0,0 +1,116 @@
+"""
+Check the storage of the saved runs of the Jobs view: identical files of
+different runs share their contents, the output is read back in chunks
+made of complete lines, the oldest runs and the contents they no longer
+share are removed, the outputs saved inline by older versions are moved to
+their own file, and a run whose output is missing is still restored.
+"""
+
+import os
+import shutil
+import yaml
+from GPS import *
+from gps_utils.internal.utils import *
+import jobs_view
+from jobs_view import snapshot_tree, collect_objects, write_output, \
+    read_output, run_manager, MAX_SAVED_RUNS, OUTPUT_FILE
+
+
+def create(directory, contents):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for name, text in contents.items():
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(text)
+    return directory
+
+
+@run_test_driver
+def run_test():
+    objects = create(os.path.abspath("objects"), {})
+    src = create(os.path.abspath("gnatprove"),
+                 {"a.spark": "same", "b.spark": "first"})
+    create(os.path.join(src, "sub"), {"c.spark": "same"})
+
+    snapshot_tree(src, os.path.abspath("run1"), objects)
+    create(src, {"b.spark": "second"})
+    snapshot_tree(src, os.path.abspath("run2"), objects)
+
+    if hasattr(os, "link"):
+        gps_assert(len(os.listdir(objects)), 3,
+                   "Identical files should share their contents")
+
+    with open(os.path.join("run2", "b.spark")) as f:
+        gps_assert(f.read(), "second", "Wrong contents for the second run")
+    with open(os.path.join("run1", "sub", "c.spark")) as f:
+        gps_assert(f.read(), "same", "Wrong contents in a subdirectory")
+
+    # Nothing is removed while a run still uses the contents
+    collect_objects(objects)
+    with open(os.path.join("run1", "b.spark")) as f:
+        gps_assert(f.read(), "first", "Contents removed too early")
+
+    # Read back an output larger than a chunk
+    jobs_view.CHUNK_SIZE = 10
+    lines = ["line %d\n" % i for i in range(20)] + ["no newline"]
+    write_output("output.gz", ["".join(lines[:7]), "".join(lines[7:])])
+    chunks = list(read_output("output.gz"))
+    gps_assert("".join(chunks), "".join(lines), "Wrong output read back")
+    gps_assert(all(c.endswith("\n") for c in chunks[:-1]), True,
+               "Chunks should be made of complete lines")
+
+    # Only the most recent runs are kept, with the contents they use
+    jobs_view.CHUNK_SIZE = 64 * 1024
+    proof = create(
+        os.path.join(GPS.Project.root().artifacts_dir(), "proof"),
+        {"shared.spark": "shared"})
+    base = run_manager._base_dir()
+    for i in range(MAX_SAVED_RUNS + 2):
+        create(proof, {"unit.spark": "run %d" % i})
+        run_manager.add_run("run %d" % i, "Test_Parser", [proof],
+                            ["output %d\n" % i])
+
+    gps_assert(sorted(run["label"] for run in run_manager.runs.values()),
+               sorted("run %d" % i for i in range(2, MAX_SAVED_RUNS + 2)),
+               "Only the most recent runs should be kept")
+    gps_assert(sorted(os.listdir(base)),
+               sorted([jobs_view.OBJECTS_DIR] +
+                      [run_manager._save_dir(run)[len(base) + 1:]
+                       for run in run_manager.runs.values()]),
+               "The directories of the removed runs should be deleted")
+    if hasattr(os, "link"):
+        gps_assert(len(os.listdir(run_manager._objects_dir())),
+                   MAX_SAVED_RUNS + 1,
+                   "The contents of the removed runs should be deleted")
+    for run in run_manager.runs.values():
+        with open(os.path.join(run_manager._save_dir(run), "proof",
+                               "unit.spark")) as f:
+            gps_assert(f.read(), run["label"], "Wrong contents kept")
+    with open(run_manager._get_archive_file()) as f:
+        gps_assert(sorted(yaml.load(f.read())), sorted(run_manager.runs),
+                   "The list of runs should be saved")
+
+    # The outputs saved inline by older versions are moved to their file
+    latest = max(run_manager.runs)
+    run = run_manager.runs[latest]
+    os.remove(run_manager._output_file(run))
+    run["output"] = "inline output\n"
+    run_manager._save_to_disk()
+    run_manager.reload_from_disk()
+    run = run_manager.runs[latest]
+    gps_assert("output" in run, False, "The inline output should be moved")
+    gps_assert("".join(read_output(run_manager._output_file(run))),
+               "inline output\n", "Wrong output moved to its file")
+    with open(run_manager._get_archive_file()) as f:
+        gps_assert("inline output" in f.read(), False,
+                   "The archive should no longer contain the output")
+
+    # A run whose output is missing is restored without it
+    os.remove(os.path.join(run_manager._save_dir(run), OUTPUT_FILE))
+    shutil.rmtree(proof)
+    run_manager.restore_run(latest)
+    with open(os.path.join(proof, "unit.spark")) as f:
+        gps_assert(f.read(), run["label"], "The files should be restored")
+    gps_assert("The output of this run was not found" in
+               GPS.Console("Messages").get_text(), True,
+               "The missing output should be reported")
@@ -0,0 +1,54 @@
+"""
+Check that a module declaring triggers is only set up when one of them
+occurs, and that its setup cost is reported.
+"""
+
+from GPS import *
+from gps_utils.internal.utils import *
+from modules import Module, Module_Metaclass
+
+calls = []
+
+
+class Lazy_Module(Module):
+    activate_on_actions = {"lazy module action": ("run_action", "General")}
+    activate_on_languages = ("cobol", )
+
+    def setup(self):
+        calls.append("setup")
+
+    def run_action(self):
+        calls.append("action")
+
+
+class Eager_Module(Module):
+
+    def setup(self):
+        calls.append("eager")
+
+
+@run_test_driver
+def run_test():
+    yield wait_idle()
+
+    gps_assert(calls, ["eager"], "Only the eager module should be set up")
+    gps_assert(Lazy_Module().is_active(), False,
+               "The lazy module should not be set up yet")
+    gps_assert("deferred     %s" % Lazy_Module().name() in
+               Module_Metaclass.setup_report(), True,
+               "The lazy module should be reported as deferred")
+
+    messages = GPS.Console("Messages").get_text()
+    GPS.execute_action("lazy module action")
+    gps_assert(calls, ["eager", "setup", "action"],
+               "The action should set up the module, then run")
+    gps_assert(GPS.Console("Messages").get_text(), messages,
+               "Nothing should be written in the Messages view")
+
+    GPS.execute_action("lazy module action")
+    gps_assert(calls, ["eager", "setup", "action", "action"],
+               "The module should only be set up once")
+
+    gps_assert(Lazy_Module().name() in
+               [name for name, _ in Module_Metaclass.setup_costs], True,
+               "The setup cost of the module should be recorded")